@@ -0,0 +1,153 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Time the solvers, the Monte Carlo simulator and the visualizer on fixed cases from a cold start, check
+         their results against golden win rates, and compare runs across commits as JSON
+'''
+from collections import namedtuple
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy
+import hog_sim
+import trot_sim
+import result_store
+import visualizer
+
+# A benchmark case: run is called with no arguments and returns a win rate, which must be within tolerance of golden
+Case = namedtuple('Case', ['name', 'run', 'golden', 'tolerance'])
+
+regression_threshold = 0.25  # A case regresses when it takes this fraction longer, or uses this much more memory, than the baseline
+
+def visualize_case():
+    '''Renders the win rates of baseline against human_strat to a scratch file, returning the rate at (0, 0)'''
+    with tempfile.TemporaryDirectory() as scratch:
+        visualizer.visualize_rate(hog_sim.baseline, hog_sim.human_strat, hog_sim.sim_game, os.path.join(scratch, 'rate.png'))
+    return hog_sim.sim_game(hog_sim.baseline, hog_sim.human_strat, 0, 0)
+
+cases = [
+    Case('hog_sim_game', lambda: hog_sim.sim_game(hog_sim.baseline, hog_sim.human_strat, 0, 0), 0.3797339372679573, 1e-9),
+    Case('hog_create_counter', lambda: hog_sim.create_counter(hog_sim.human_strat)[2], 0.7555526144073508, 1e-9),
+    Case('hog_learn_3', lambda: hog_sim.learn(3, hog_sim.human_strat)[2], 0.5189793956774748, 1e-9),
+    Case('trot_expected_win_rate', lambda: trot_sim.expected_win_rate(trot_sim.perf_strat_old, hog_sim.baseline), 0.7803038480380757, 1e-9),
+    Case('trot_create_mock_counter', lambda: trot_sim.create_mock_counter(trot_sim.perf_strat_old, hog_sim.baseline)[2], 0.8861841942056624, 1e-9),
+    # Seeded, but checked only against the exact rate so that a change to how dice are drawn is not a failure
+    Case('hog_average_win_rate_10k', lambda: hog_sim.average_win_rate(hog_sim.human_strat, hog_sim.baseline, 10000, seed=0), 0.6224693832407717, 0.015),
+    Case('visualize_rate', visualize_case, 0.3797339372679573, 1e-9),
+]
+
+def cold_start():
+    '''Clears every memo and detaches the result store, so that each run solves from scratch'''
+    hog_sim.clear_registered_memos()
+    result_store.use_store(None)
+
+def run_case(case, repeat = 3):
+    '''Runs a case repeat times from a cold start, then once more to measure its memory
+
+       Args:
+           case (Case): The case to run
+           repeat (int): The number of timed runs, of which the fastest is kept
+
+        Returns:
+            dict: The fastest wall time in seconds, the peak memory allocated in bytes, the win rate returned,
+                  the golden rate and whether the two agree
+    '''
+    times = []
+    for _ in range(repeat):
+        cold_start()
+        start = time.perf_counter()
+        value = case.run()
+        times.append(time.perf_counter() - start)
+    cold_start()
+    tracemalloc.start()  # Measured on a separate run, since tracing slows the code down
+    try:
+        case.run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'peak_bytes': peak, 'value': float(value), 'golden': case.golden,
+            'ok': abs(value - case.golden) <= case.tolerance}
+
+def commit():
+    '''Returns the git commit of the working tree, or None if it cannot be found'''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(names = None, repeat = 3, verbose = False):
+    '''Runs the benchmark cases, restoring the result store in use afterwards
+
+       Args:
+           names (list): The names of the cases to run, or None for all of them
+           repeat (int): See run_case
+           verbose (bool): True to print each case as it finishes
+
+        Returns:
+            dict: The commit, Python and numpy versions, and the results of each case keyed by name, see run_case
+    '''
+    store = result_store.active_store
+    results = {}
+    try:
+        for case in cases:
+            if names and case.name not in names:
+                continue
+            results[case.name] = run_case(case, repeat)
+            if verbose:
+                result = results[case.name]
+                print('{:28}{:10.4f}s{:10.1f}MB  {:.10f}  {}'.format(case.name, result['seconds'], result['peak_bytes'] / 2**20,
+                                                                    result['value'], 'ok' if result['ok'] else 'WRONG'))
+    finally:
+        result_store.active_store = store
+    return {'commit': commit(), 'python': platform.python_version(), 'numpy': numpy.__version__, 'cases': results}
+
+def compare(results, baseline, threshold = regression_threshold):
+    '''Finds the cases that got slower or larger than in a baseline run
+
+       Args:
+           results (dict): A run, as returned by run_benchmarks
+           baseline (dict): An earlier run
+           threshold (float): The fraction by which a case's time or peak memory may grow before it counts
+
+        Returns:
+            list: Descriptions of each regression
+    '''
+    regressions = []
+    for name, result in results['cases'].items():
+        before = baseline['cases'].get(name)
+        if before is None:
+            continue
+        for measure in ('seconds', 'peak_bytes'):
+            if result[measure] > before[measure] * (1 + threshold):
+                regressions.append('{} {}: {:.4g} -> {:.4g} ({:+.0%})'.format(name, measure, before[measure], result[measure],
+                                                                             result[measure] / before[measure] - 1))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the solvers on fixed cases and check their win rates')
+    parser.add_argument('names', nargs='*', help='cases to run, all by default: ' + ', '.join(case.name for case in cases))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case, the fastest is kept')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=regression_threshold, help='allowed fractional slowdown')
+    args = parser.parse_args()
+    results = run_benchmarks(args.names, args.repeat, verbose=True)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    failures = [name for name, result in results['cases'].items() if not result['ok']]
+    if args.baseline:
+        with open(args.baseline) as file:
+            failures += compare(results, json.load(file), args.threshold)
+    for failure in failures:
+        print('FAILED', failure)
+    sys.exit(1 if failures else 0)
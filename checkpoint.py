@@ -0,0 +1,180 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Run learn in a directory that is checkpointed as it goes, so that a run stopped at any point, even in the
+         middle of a solve, resumes exactly where it stopped instead of starting over from the seed
+'''
+from hog_sim import LearnRecord, LearnState
+from hog_rules import default_rules
+from strategy import Strategy, save_strategy, load_strategy
+import json
+import os
+import time
+import numpy
+import hog_sim
+import trot_sim
+
+checkpoint_interval = 60  # Seconds between checkpoints taken in the middle of an iteration
+solution_names = ('counter_table', 'counter_rates', 'opponent_rates')  # The solver arrays saved by a checkpoint
+
+def atomic_write(path, write):
+    '''Writes a file so that readers, and a run resumed after a crash, see either the old file or the new one.
+       The file is written beside path, flushed to disk and then renamed over it.
+
+       Args:
+           path (str): The file to replace
+           write (function): Called with a binary file object to write the contents
+    '''
+    scratch = '{}.{}.tmp'.format(path, os.getpid())
+    with open(scratch, 'wb') as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(scratch, path)
+
+class LearnRun:
+    '''The state of a learn run kept in a directory. The directory holds the strategy created by each iteration as
+       iteration_<n>.npy, checkpoint.npz with everything needed to resume, and manifest.json listing the metrics of
+       each iteration. The checkpoint is the only record that resuming relies on, and the manifest is rewritten from
+       it after every checkpoint.
+    '''
+    def __init__(self, path, game, strategies, interval = checkpoint_interval, rules = default_rules):
+        '''
+           Args:
+               path (str): The run directory, created if needed
+               game (str): 'hog' or 'trot'
+               strategies (tuple): The Strategy objects the run starts from, which a resumed run must match
+               interval (float): Seconds between checkpoints taken in the middle of an iteration
+               rules (RuleSet): The goal and dice of the game, which a resumed run must match
+        '''
+        os.makedirs(path, exist_ok=True)
+        self.path, self.interval = path, interval
+        self.last_saved = time.monotonic()
+        self.meta = {'game': game, 'strategies': [strat.digest for strat in strategies], 'rules': rules.digest,
+                     'iteration': 0, 'last_rate': None, 'finished': False, 'next_total': None, 'records': []}
+        self.arrays = {}
+        try:
+            with numpy.load(os.path.join(path, 'checkpoint.npz'), allow_pickle=False) as saved:
+                self.arrays = {name: saved[name] for name in saved.files if name != 'meta'}
+                meta = json.loads(str(saved['meta']))
+        except FileNotFoundError:
+            return
+        if (meta['game'], meta['strategies'], meta.get('rules', default_rules.digest)) != \
+                (game, self.meta['strategies'], rules.digest):
+            raise ValueError('{} holds a different run'.format(path))
+        self.meta = meta
+
+    def records(self):
+        '''Yields a LearnRecord for each iteration finished so far'''
+        for entry in self.meta['records']:
+            strat = load_strategy(os.path.join(self.path, entry['strategy']))
+            yield LearnRecord(entry['iteration'], strat, entry['rate'], entry['expected_rate'], entry['changed_cells'], entry['seconds'])
+
+    def state(self):
+        '''Returns the LearnState to resume learn_iterations from, or None to start from the seed'''
+        if 'strat' not in self.arrays:
+            return None
+        warm_start = None
+        if 'previous' in self.arrays:
+            warm_start = self.arrays['previous'], tuple(self.arrays['previous_' + name] for name in solution_names)
+        partial = None
+        if self.meta['next_total'] is not None:
+            partial = self.meta['next_total'], tuple(self.arrays['partial_' + name] for name in solution_names)
+        return LearnState(self.meta['iteration'], Strategy(self.arrays['strat']), warm_start, self.meta['last_rate'],
+                          partial, self.meta['finished'])
+
+    def snapshot(self, state, record):
+        '''The snapshot hook of learn_iterations. Checkpoints a solve part way through, at most once per interval,
+           or saves a finished iteration along with the state the next one starts from.
+        '''
+        arrays = {'strat': state.strategy.table}
+        if state.warm_start is not None:
+            arrays['previous'] = state.warm_start[0]
+            arrays.update(('previous_' + name, array) for name, array in zip(solution_names, state.warm_start[1]))
+        if record is None:
+            self.save(arrays, (state.partial[0], dict(zip(solution_names, state.partial[1]))))
+        else:
+            self.finish_iteration(record, arrays, state.finished)
+
+    def save(self, arrays, partial = None, force = False):
+        '''Checkpoints the run, unless force is False and the last checkpoint was taken less than interval ago
+
+           Args:
+               arrays (dict): The named arrays needed to start the current iteration
+               partial (tuple): The next score sum to solve and the named arrays of the solver, for a checkpoint
+                                taken in the middle of an iteration
+               force (bool): True to checkpoint regardless of when the last checkpoint was taken
+        '''
+        if not force and time.monotonic() - self.last_saved < self.interval:
+            return
+        self.meta['next_total'] = None if partial is None else int(partial[0])
+        self.arrays = dict(arrays)
+        if partial is not None:
+            self.arrays.update(('partial_' + name, array) for name, array in partial[1].items())
+        atomic_write(os.path.join(self.path, 'checkpoint.npz'),
+                     lambda file: numpy.savez(file, meta=numpy.array(json.dumps(self.meta)), **self.arrays))
+        atomic_write(os.path.join(self.path, 'manifest.json'),
+                     lambda file: file.write(json.dumps({key: value for key, value in self.meta.items() if key != 'next_total'},
+                                                        indent=2).encode()))
+        self.last_saved = time.monotonic()
+
+    def finish_iteration(self, record, arrays, finished):
+        '''Saves the strategy created by an iteration and checkpoints the start of the next
+
+           Args:
+               record (LearnRecord): The finished iteration
+               arrays (dict): The named arrays needed to start the next iteration
+               finished (bool): True if learning has stopped
+        '''
+        name = 'iteration_{}.npy'.format(record.iteration)
+        atomic_write(os.path.join(self.path, name), lambda file: save_strategy(record.strategy, file))
+        self.meta['records'].append({'iteration': record.iteration, 'strategy': name, 'rate': record.rate,
+                                     'expected_rate': record.expected_rate, 'changed_cells': record.changed_cells,
+                                     'seconds': record.seconds})
+        self.meta['iteration'], self.meta['last_rate'], self.meta['finished'] = record.iteration + 1, record.rate, finished
+        self.save(arrays, force=True)
+
+def hog_learn(path, iterations = 12, seed = lambda x, y: 4, tolerance = 1e-12, interval = checkpoint_interval,
+              rules = default_rules):
+    '''Runs hog_sim.learn_iterations in a run directory, checkpointing it as it goes. Calling it again with the same
+       directory and seed resumes the run, and a run stopped by its number of iterations can be extended by asking
+       for more.
+
+       Args:
+           path (str): The run directory, see LearnRun
+           iterations (int): The number of counter strategies created after the first
+           seed (function): The initial strategy used to create the counter in the first iteration
+           tolerance (float): See hog_sim.learn_iterations
+           interval (float): Seconds between checkpoints taken in the middle of an iteration
+           rules (RuleSet): The goal and dice of the game
+
+        Yields:
+            LearnRecord: Every iteration of the run, starting with those finished before it was resumed
+    '''
+    seed = Strategy.from_callable(seed, rules.size)
+    run = LearnRun(path, 'hog', (seed,), interval, rules)
+    yield from run.records()
+    yield from hog_sim.learn_iterations(iterations, seed, tolerance, rules=rules, resume=run.state(), snapshot=run.snapshot)
+
+def trot_learn(path, tutor, seed, iterations = 1, tolerance = 1e-12, interval = checkpoint_interval, rules = default_rules):
+    '''Runs trot_sim.learn_iterations in a run directory, checkpointing it as it goes, see hog_learn
+
+       Args:
+           path (str): The run directory, see LearnRun
+           tutor (strategy function): The first tutor
+           seed (strategy function): The strategy every mock counter is built against
+           iterations (int): The most mock counters created
+           tolerance (float): See trot_sim.learn_iterations
+           interval (float): Seconds between checkpoints taken in the middle of an iteration
+           rules (RuleSet): The goal and dice of the game
+
+        Yields:
+            LearnRecord: Every iteration of the run, starting with those finished before it was resumed
+    '''
+    tutor, seed = Strategy.from_callable(tutor, rules.size), Strategy.from_callable(seed, rules.size)
+    run = LearnRun(path, 'trot', (tutor, seed), interval, rules)
+    yield from run.records()
+    yield from trot_sim.learn_iterations(tutor, seed, iterations, tolerance, rules=rules, resume=run.state(),
+                                         snapshot=run.snapshot)
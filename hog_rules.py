@@ -0,0 +1,146 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Precompute the rules of Hog as dense arrays, so that simulators index into tables instead of
+         rebuilding dictionaries and calling rule functions inside their hot loops
+'''
+import hashlib
+import numpy
+
+max_score = 100
+max_dice = 10
+max_points = 60
+
+def combinations(total, num_parts, parts = (2, 3, 4, 5, 6)):
+    '''Gives the number of combinations by which exactly num_parts amount of parts
+       can be used to sum to total
+
+       Args:
+           total (int): Total value attempting to sum to
+           num_parts (int): The number of parts available to use to reach the total
+           parts (tuple): The parts available for use. Defaults to the non "Pig Out" values for hog
+
+        Returns:
+            int: The number of possible combinations
+
+    '''
+    ways = {0: 1}
+    for _ in range(num_parts):
+        next_ways = {}
+        for subtotal, count in ways.items():
+            for part in parts:
+                next_ways[subtotal + part] = next_ways.get(subtotal + part, 0) + count
+        ways = next_ways
+    return ways.get(total, 0)
+
+def is_swap(score1, score2):
+    '''Gameplay rule. See https://cs61a.org/proj/hog/ for more details
+
+       Args:
+           score1 (int): The score of player1
+           score2 (int): The score of player2
+
+        Returns:
+            bool: True if the pair of scores qualify for a Swine Swap, False otherwise
+
+    '''
+    return score1 > 1 and score2 > 1 and (score1 % score2 == 0 or score2 % score1 == 0) and score1 != score2
+
+def free_bacon(other_score):
+    '''Gameplay rule. See https://cs61a.org/proj/hog/ for more details
+
+       Args:
+           other_score (int): Score of the opposing player
+
+        Returns:
+            int: The max of the digits of the opponents score, plus 1. Up to the original goal of 100, the score is
+                 split into score // 10 and score % 10 as in the original rules, so 100 counts as 10 and 0
+
+    '''
+    if other_score <= 100:
+        return max(other_score // 10, other_score % 10) + 1
+    return max(int(digit) for digit in str(other_score)) + 1
+
+def dice_outcomes(max_dice = max_dice, sides = 6, max_points = max_points):
+    '''Tabulates the probability of every point total for every positive number of dice
+
+       Args:
+           max_dice (int): The most dice that can be rolled
+           sides (int): The number of sides on each die
+           max_points (int): The most points that can be scored in a turn
+
+        Returns:
+            numpy.ndarray: (max_dice + 1)x(max_points + 1) array, where [num_dice][points] is the probability of
+                           scoring points by rolling num_dice. The row for zero dice is empty, see free_bacon_points
+
+    '''
+    probs = numpy.zeros((max_dice + 1, max_points + 1))
+    for num_dice in range(1, max_dice + 1):
+        total = pow(sides, num_dice)
+        probs[num_dice, 1] = 1 - pow(sides - 1, num_dice)/total
+        for points in range(2, min(max_points, num_dice * sides) + 1):
+            probs[num_dice, points] = combinations(points, num_dice, tuple(range(2, sides + 1)))/total
+    return probs
+
+class RuleSet:
+    '''The goal and dice of a game of Hog, along with the dense tables of its rules. Solvers take a RuleSet so that
+       the same code can play to any goal. A player wins by scoring more than max_score points, and Free Bacon and
+       Swine Swap work as in free_bacon and is_swap at every score.
+
+       Rates are solved in dtype, so float32 halves the memory of large games at the cost of precision. Rounding
+       builds up over the score-sum diagonals, and float32 rates are not clipped, so they can stray past 0.0 and 1.0
+       by a few units in the last place.
+       RuleSets compare and hash by the contents of their tables.
+    '''
+    def __init__(self, max_score = max_score, max_dice = max_dice, sides = 6, dtype = numpy.float64):
+        self.max_score, self.max_dice, self.sides = max_score, max_dice, sides
+        self.dtype = numpy.dtype(dtype)
+        scores = numpy.arange(max_score + 1)
+        self.free_bacon_points = numpy.array([free_bacon(score) for score in range(max_score + 1)])
+        self.max_points = max(max_dice * sides, int(self.free_bacon_points.max()))
+        self.outcome_probs = dice_outcomes(max_dice, sides, self.max_points)
+        score1, score2 = scores[:, None], scores[None, :]
+        self.swap_matrix = ((score1 > 1) & (score2 > 1) & (score1 != score2)
+                            & ((score1 % numpy.maximum(score2, 1) == 0) | (score2 % numpy.maximum(score1, 1) == 0)))
+        # [num_dice][opp_score][points]: outcome_probs with the free bacon row filled in for every opposing score
+        self.turn_outcomes = numpy.repeat(self.outcome_probs[:, None], max_score + 1, axis=1).astype(self.dtype)
+        self.turn_outcomes[0, scores, self.free_bacon_points] = 1
+        for table in (self.outcome_probs, self.free_bacon_points, self.swap_matrix, self.turn_outcomes):
+            table.flags.writeable = False
+        # Identifies the rule set, so that results solved under different rules are never confused
+        tables = [self.outcome_probs, self.free_bacon_points, self.swap_matrix]
+        if self.dtype != numpy.float64:
+            tables.append(numpy.array(self.dtype.str.encode()))
+        self.digest = hashlib.blake2b(b''.join(table.tobytes() for table in tables), digest_size=16).hexdigest()
+
+    @property
+    def size(self):
+        '''The number of possible scores of each player'''
+        return self.max_score + 1
+
+    def __eq__(self, other):
+        if not isinstance(other, RuleSet):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return 'RuleSet(max_score={}, max_dice={}, sides={}, dtype={})'.format(self.max_score, self.max_dice, self.sides, self.dtype.name)
+
+default_rules = RuleSet()
+
+outcome_probs = default_rules.outcome_probs
+free_bacon_points = default_rules.free_bacon_points
+swap_matrix = default_rules.swap_matrix
+turn_outcomes = default_rules.turn_outcomes
+
+# Nested list copies for the recursive simulators, since scalar lookups are much faster on lists than on numpy arrays
+turn_outcome_rows = turn_outcomes.tolist()
+turn_outcome_points = [[[points for points, freq in enumerate(row) if freq] for row in rows] for rows in turn_outcome_rows]
+swap_rows = swap_matrix.tolist()
+
+rules_digest = default_rules.digest
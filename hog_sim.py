@@ -7,45 +7,115 @@ Purpose: Simulate and find the expected win rate for two strategies in the game
          Create an optimal counter strategy by selecting the best rolls for each set of scores when playing against a given strategy
 '''
 from random import randint
+from collections import OrderedDict, namedtuple
+from itertools import islice
+from strategy import Strategy
+from result_store import cached
+from profiling import profiled, count_states
+import monte_carlo
+import inspect
+from hog_rules import max_score, is_swap, free_bacon, combinations, outcome_probs, default_rules
+import numpy
 import sys
+import time
 
-sys.setrecursionlimit(100000)
+tie_tolerance = 1e-12  # Win rates closer than this are treated as equal when picking a roll
 
-max_score = 100
-def memoize(fn):
-    '''Memoization decorator'''
+memo_registry = []  # Every memoized function, in order of definition
+missing = object()  # Marks a memo lookup that found nothing, since None can be a result
+
+# One iteration of learn: the counter created, its rate when it moves first, its expected rate against the strategy
+# it counters, the number of cells where it differs from that strategy, and the seconds it took
+LearnRecord = namedtuple('LearnRecord', ['iteration', 'strategy', 'rate', 'expected_rate', 'changed_cells', 'seconds'])
+
+# Where a learn run stands: the next iteration, the strategy it counters (the tutor, in Time Trot), the earlier table
+# and solution its solve is warm started from or None, the rate of the last counter or None, the score sum and solver
+# arrays of a solve stopped part way or None, and whether learning has stopped
+LearnState = namedtuple('LearnState', ['iteration', 'strategy', 'warm_start', 'last_rate', 'partial', 'finished'])
+
+def memoize(fn = None, maxsize = None):
+    '''Memoization decorator. Usable as @memoize or @memoize(maxsize=n), in which case the least recently
+       used results are evicted once more than n are stored. Memoized functions keep count of their hits and
+       misses, and are added to memo_registry so that their memos can be inspected and cleared together.
+       Arguments left out are filled in from their defaults, so that f(x) and f(x, default) share a result.
+       Memos can be read and filled from several threads at once, though two threads may solve the same result.
+    '''
+    if fn is None:
+        return lambda fn: memoize(fn, maxsize)
+    code = inspect.unwrap(fn).__code__
+    defaults = inspect.unwrap(fn).__defaults__ or ()
+    num_params, first_default = code.co_argcount, code.co_argcount - len(defaults)
     def memoized_fn(*args):
-        if args not in memoized_fn.memo:
-            memoized_fn.memo[args]=fn(*args)
-        return memoized_fn.memo[args]
-    memoized_fn.memo = {}
+        if len(args) < num_params:
+            args += defaults[len(args) - first_default:]
+        memo = memoized_fn.memo
+        result = memo.get(args, missing)
+        if result is not missing:
+            memoized_fn.hits += 1
+            if maxsize is not None:
+                try:
+                    memo.move_to_end(args)
+                except KeyError:  # Evicted by another thread since the lookup
+                    pass
+            return result
+        memoized_fn.misses += 1
+        result = memo[args] = fn(*args)
+        if maxsize is not None and len(memo) > maxsize:
+            try:
+                memo.popitem(last = False)
+            except KeyError:  # Emptied by another thread
+                pass
+        return result
+    def clear():
+        '''Empties the memo and resets its statistics'''
+        memoized_fn.memo = OrderedDict() if maxsize is not None else {}
+        memoized_fn.hits = memoized_fn.misses = 0
+    def stats():
+        '''Returns a dict of the memo's hits, misses, maxsize, current size and estimated size in bytes'''
+        return {'hits': memoized_fn.hits, 'misses': memoized_fn.misses, 'maxsize': maxsize,
+                'size': len(memoized_fn.memo), 'bytes': estimate_memo_bytes(memoized_fn.memo)}
+    memoized_fn.__name__, memoized_fn.__qualname__ = fn.__name__, fn.__qualname__
+    memoized_fn.__module__, memoized_fn.__doc__ = fn.__module__, fn.__doc__
+    memoized_fn.__wrapped__ = fn
+    memoized_fn.clear, memoized_fn.stats = clear, stats
+    clear()
+    memo_registry.append(memoized_fn)
     return memoized_fn
 
-@memoize
-def combinations(total, num_parts, parts = (2, 3, 4, 5, 6)):
-    '''Gives the number of combinations by which exactly num_parts amount of parts
-       can be used to sum to total
-       
-       Args:
-           total (int): Total value attempting to sum to
-           num_parts (int): The number of parts available to use to reach the total
-           parts (tuple): The parts available for use. Defaults to the non "Pig Out" values for hog
-        
-        Returns:
-            int: The number of possible combinations
-            
-    '''
-    combos = 0
-    if num_parts == 1:
-        if total in parts:
-            return 1
-        return 0
-    else:
-        for i in parts:
-            combos += combinations(total - i, num_parts - 1, parts)
-    return combos
+def estimate_bytes(obj):
+    '''Estimates the memory held by a memo key or result, following tuples and numpy arrays'''
+    if isinstance(obj, tuple):
+        return sys.getsizeof(obj) + sum(estimate_bytes(item) for item in obj)
+    if isinstance(obj, numpy.ndarray):
+        return obj.nbytes + 128
+    return sys.getsizeof(obj)
+
+def estimate_memo_bytes(memo, sample_size = 100):
+    '''Estimates the memory held by a memo by measuring an evenly spaced sample of its entries'''
+    if not memo: return sys.getsizeof(memo)
+    step = max(1, len(memo) // sample_size)
+    sample = [estimate_bytes(key) + estimate_bytes(value) for key, value in islice(memo.items(), 0, None, step)]
+    return sys.getsizeof(memo) + sum(sample) * len(memo) // len(sample)
+
+def memo_stats(module = None):
+    '''Returns the stats of every registered memo, or of only those defined in module, keyed by qualified name'''
+    return {fn.__module__ + '.' + fn.__qualname__: fn.stats() for fn in memo_registry if module in (None, fn.__module__)}
+
+def clear_registered_memos(module = None):
+    '''Clears every registered memo, or only those defined in module'''
+    for fn in memo_registry:
+        if module in (None, fn.__module__):
+            fn.clear()
+
+diagonal_memo_size = 256  # Games with more possible scores than this rebuild their diagonals instead of memoizing them
+
+def memoized_for(fn, rules):
+    '''Returns the memoized function fn for games small enough to keep all of its results, or the function it wraps
+       for larger games, so that solving them takes memory linear in the number of states'''
+    return fn if rules.size <= diagonal_memo_size else fn.__wrapped__
 
 @memoize
+@profiled
 def get_frequencies(num_dice, opp_score = None):
     '''Creates a dictionary of point frequency pairs for each possible point total outcome
        for the given number of dice
@@ -58,41 +128,80 @@ def get_frequencies(num_dice, opp_score = None):
             
     '''
     if num_dice == 0: return {free_bacon(opp_score): 1}
-    total = pow(6, num_dice)
-    freqs  = {1: 1 - pow(5, num_dice)/total}
-    for i in range(2, 61):
-        freq = combinations(i, num_dice)/total
-        if freq:
-            freqs[i] = freq
-    return freqs
-
-def is_swap(score1, score2):
-    '''Gameplay rule. See https://cs61a.org/proj/hog/ for more details
-       
+    return {points: float(freq) for points, freq in enumerate(outcome_probs[num_dice]) if freq}
+
+def strategy_table(strat):
+    '''Evaluates a strategy at every pair of scores, producing the dense roll table used by solve_game
+
        Args:
-           score1 (int): The score of player1
-           score2 (int): The score of player2
-        
+           strat (strategy function): The strategy to tabulate
+
         Returns:
-            bool: True if the pair of scores qualify for a Swine Swap, False otherwise
-            
+            numpy.ndarray: (max_score + 1)x(max_score + 1) array of rolls, indexed by [score1][score2]
+
     '''
-    return score1 > 1 and score2 > 1 and (score1 % score2 == 0 or score2 % score1 == 0) and score1 != score2
+    return Strategy.from_callable(strat).table
+
+@memoize(maxsize = 1024)
+def score_diagonal(total, rules = default_rules):
+    '''Finds every pair of scores summing to total, along with the state the opponent moves from after each
+       possible number of points is scored. Every turn strictly increases the sum of the scores (Swine Swap only
+       exchanges them), so states can be solved one diagonal at a time, starting from the highest total.
 
-def free_bacon(other_score):
-    '''Gameplay rule. See https://cs61a.org/proj/hog/ for more details
-       
        Args:
-           other_score (int): Score of the opposing player
-        
+           total (int): The sum of the two scores
+           rules (RuleSet): The goal and dice of the game
+
         Returns:
-            int: The max of the two digits of the opponents score, plus 1
-            
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The mover's scores, the opponent's scores, and an array of
+                                                         flat indices of the opponent's next state for 1 to
+                                                         rules.max_points points, (max_score + 1)**2 if the mover
+                                                         has already won
+
     '''
-    return max(other_score // 10, other_score % 10) + 1
+    size = rules.size
+    score1 = numpy.arange(max(0, total - rules.max_score), min(rules.max_score, total) + 1)
+    score2 = total - score1
+    new_score1 = score1[:, None] + numpy.arange(1, rules.max_points + 1)
+    bounded = numpy.minimum(new_score1, rules.max_score)
+    swapped = rules.swap_matrix[bounded, score2[:, None]]
+    next_index = numpy.where(swapped, bounded * size + score2[:, None], score2[:, None] * size + bounded)
+    next_index[new_score1 > rules.max_score] = size * size
+    return score1, score2, next_index
 
-@memoize
-def sim_game(strat1, strat2, score1, score2):
+@profiled
+def solve_game(table1, table2, rules = default_rules):
+    '''Solves every state of a game between two strategies at once. States are visited in order of decreasing
+       score sum, so each diagonal only depends on diagonals that have already been solved.
+
+       Args:
+           table1 (array-like): Player 1's roll table, indexed by [score1][score2]
+           table2 (array-like): Player 2's roll table, indexed by [score2][score1]
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: Arrays where [score1][score2] is sim_game(strat1, strat2, score1, score2)
+                                          and [score2][score1] is sim_game(strat2, strat1, score2, score1)
+
+    '''
+    size = rules.size
+    tables = numpy.stack([numpy.asarray(table1), numpy.asarray(table2)]).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    rates = numpy.zeros((2, size * size + 1), dtype=rules.dtype)  # The extra entry is the opponent's rate after the mover has won
+    for total in range(2 * rules.max_score, -1, -1):
+        score1, score2, next_index = memoized_for(score_diagonal, rules)(total, rules)
+        freqs = probs[tables[:, score1, score2], score2]
+        rates[:, score1 * size + score2] = (freqs * (1 - rates[::-1, next_index])).sum(axis=-1)
+    count_states(2 * size * size)
+    return rates[0, :-1].reshape(size, size), rates[1, :-1].reshape(size, size)
+
+@memoize(maxsize = 1024)
+def win_rates(strat1, strat2, rules = default_rules):
+    '''Memoized solve_game for a pair of Strategy objects, kept in the active result store if there is one'''
+    return cached('win_rates', (strat1, strat2), lambda: solve_game(strat1.table, strat2.table, rules), rules)
+
+@profiled
+def sim_game(strat1, strat2, score1, score2, rules = default_rules):
     '''Plays a simulated game between two strategies from a given set of scores.
        Returns the expected probability of strat1 winning against strat2.
 
@@ -101,18 +210,22 @@ def sim_game(strat1, strat2, score1, score2):
            score2 (int): Player 2's score
            strat1 (strategy function): Player 1's strategy
            strat2 (strategy function): Player 2's strategy
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
         
         Returns:
             float: The expected probability of strat1 winning against strat2
             
     '''
-    num_rolls = strat1(score1, score2)
-    if num_rolls:
-        freqs = get_frequencies(num_rolls)
-        return sum([apply_rules(strat1, strat2, score1 + points, score2) * freqs[points] for points in freqs])
-    return apply_rules(strat1, strat2, score1 + free_bacon(score2), score2)
+    rates = win_rates(Strategy.from_callable(strat1, rules.size), Strategy.from_callable(strat2, rules.size), rules)
+    return float(rates[0][score1][score2])
 
-@memoize
+def expected_win_rate(strat1, strat2, rules = default_rules):
+    '''Calculates the expected win rate of strat1 against strat2, with each strategy moving first half the time,
+       in a game played by rules'''
+    rates1, rates2 = win_rates(Strategy.from_callable(strat1, rules.size), Strategy.from_callable(strat2, rules.size), rules)
+    return (float(rates1[0][0]) + 1 - float(rates2[0][0])) / 2
+
+@profiled
 def apply_rules(strat1, strat2, score1, score2):
     '''Applies the rules of Hog, then simulates strat2's turn to predict the win rate of strat1.
        See https://cs61a.org/proj/hog/ for more details on the rules.
@@ -132,47 +245,97 @@ def apply_rules(strat1, strat2, score1, score2):
         score1, score2 = score2, score1
     return 1 - sim_game(strat2, strat1, score2, score1)
            
-@memoize
-def sim_counter(score1, score2, strat):
+@profiled
+def solve_counter(table, warm_start = None, rules = default_rules, resume = None, snapshot = None):
+    '''Solves for the optimal counter strategy against a roll table without recursion. States are visited in order
+       of decreasing score sum, and all 11 rolls are evaluated for a whole diagonal at once.
+
+       Args:
+           table (array-like): The opponent's roll table, indexed by [score1][score2]
+           warm_start (tuple): An earlier opponent table and the result of solving it. Diagonals above the highest
+                               score sum where the two tables differ only depend on unchanged cells, so they are
+                               copied from the earlier result instead of being solved again
+           rules (RuleSet): The goal and dice of the game
+           resume (tuple): A score sum and the arrays passed to snapshot after solving the diagonal above it. Solving
+                           continues from that diagonal, giving the same result as an uninterrupted solve
+           snapshot (function): Called after each diagonal with the next score sum to solve and the solver's
+                                internal (counter_table, counter_rates, opponent_rates) arrays, to checkpoint them
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The counter's roll table, the counter's win rates when it is
+                                                         about to move, and the opponent's win rates when it is about
+                                                         to move, all indexed by [mover's score][other score]
+
+    '''
+    size = rules.size
+    table = numpy.asarray(table).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    counter_table = numpy.zeros((size, size), dtype=numpy.uint8)
+    counter_rates = numpy.zeros(size * size + 1, dtype=rules.dtype)  # The extra entries are the rates after the other player has won
+    opponent_rates = numpy.zeros(size * size + 1, dtype=rules.dtype)
+    start = 2 * rules.max_score
+    if warm_start is not None:
+        previous_table, (previous_counter, previous_counter_rates, previous_opponent_rates) = warm_start
+        counter_table[:] = previous_counter
+        counter_rates[:-1] = numpy.ravel(previous_counter_rates)
+        opponent_rates[:-1] = numpy.ravel(previous_opponent_rates)
+        changed = numpy.argwhere(table != numpy.asarray(previous_table))
+        start = changed.sum(axis=1).max(initial=-1)
+    if resume is not None:
+        start, (counter_table[:], counter_rates[:], opponent_rates[:]) = resume
+    solved = 0
+    for total in range(start, -1, -1):
+        score1, score2, next_index = memoized_for(score_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        solved += len(flat)
+        roll_rates = (probs[:, score2] * (1 - opponent_rates[next_index])).sum(axis=-1)
+        best_rates = roll_rates.max(axis=0)
+        counter_table[score1, score2] = (roll_rates >= best_rates - tie_tolerance).argmax(axis=0)  # Ties go to the fewest dice
+        counter_rates[flat] = best_rates
+        freqs = probs[table[score1, score2], score2]
+        opponent_rates[flat] = (freqs * (1 - counter_rates[next_index])).sum(axis=-1)
+        if snapshot is not None:
+            snapshot(total - 1, (counter_table, counter_rates, opponent_rates))
+    count_states(2 * solved)
+    return counter_table, counter_rates[:-1].reshape(size, size), opponent_rates[:-1].reshape(size, size)
+
+@memoize(maxsize = 256)
+def counter_solution(strat, rules = default_rules):
+    '''Memoized solve_counter for a Strategy object, kept in the active result store if there is one'''
+    return cached('counter', (strat,), lambda: solve_counter(strat.table, rules=rules), rules)
+
+@profiled
+def sim_counter(score1, score2, strat, rules = default_rules):
     '''Determines the optimal number of dice to roll given a pair of scores and an opponent strategy.
        
        Args:
            score1 (int): The optimal strategy's score
            score2 (int): The opponent's score
            strat (strategy function): Opponent strategy
+           rules (RuleSet): The goal and dice of the game
         
         Returns:
             (float, int): The best rate of winning and the best roll associated with it
     
     '''
-    best_roll = 0
-    best_rate = apply_rules_counter(score1 + free_bacon(score2), score2, strat, sim_opponent)
-    for num_rolls in range(1, 11):
-        freqs = get_frequencies(num_rolls)
-        total_rate = sum([apply_rules_counter(score1 + points, score2, strat, sim_opponent) * freqs[points] for points in freqs])
-        if total_rate > best_rate:
-            best_rate = total_rate
-            best_roll = num_rolls
-    return best_rate, best_roll
-
-@memoize          
-def sim_opponent(score1, score2, strat):
+    counter_table, counter_rates, _ = counter_solution(Strategy.from_callable(strat, rules.size), rules)
+    return float(counter_rates[score1][score2]), int(counter_table[score1][score2])
+
+def sim_opponent(score1, score2, strat, rules = default_rules):
     '''Determines the opponent strategy's win rate against an optimal strategy.
        
        Args:
            score1 (int): The opponent's score
            score2 (int): The optimal strategy's score
            strat (strategy function): Opponent strategy
+           rules (RuleSet): The goal and dice of the game
         
         Returns:
             (float, int): The expected win rate and the number of dice rolled
             
     '''
-    num_rolls = strat(score1, score2)
-    freqs = get_frequencies(num_rolls, score2)
-    return sum([apply_rules_counter(score1 + points, score2, strat, sim_counter) * freqs[points] for points in freqs]), num_rolls
+    return float(counter_solution(Strategy.from_callable(strat, rules.size), rules)[2][score1][score2]), strat(score1, score2)
 
-@memoize
 def apply_rules_counter(score1, score2, strat, next_sim):
     '''Applies the rules of Hog, then returns the expected win rate of Player 1
        See https://cs61a.org/proj/hog_contest/ for more details
@@ -194,53 +357,305 @@ def apply_rules_counter(score1, score2, strat, next_sim):
 
 def clear_memos():
     '''Clears the memos of methods used in learn'''
-    expected_frequency.memo = {}
-    sim_counter.memo = {}
-    sim_opponent.memo = {}
-    apply_rules_counter.memo = {}
-    apply_rules.memo = {}
-    sim_game.memo = {}
-
-def create_counter(strat):
+    clear_registered_memos(__name__)
+
+@profiled
+def create_counter(strat, rules = default_rules):
     '''Creates the optimal counter strategy against strat
        
        Args:
            strat (function): The strategy to be countered
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
         
         Returns:
-            function, list, float: The optimal counter strategy against strat, the lookup table used 
-                                   by counter_strat, and the counter's win rate when it moves first
+            Strategy, numpy.ndarray, float: The optimal counter strategy against strat, the lookup table used 
+                                            by counter_strat, and the counter's win rate when it moves first
     
     '''
-    counter_table = []
-    for y in range(max_score + 1):
-        counter_table.append([0] * (max_score + 1))
-        for x in range(max_score + 1):
-            counter_table[y][x] = sim_counter(y, x, strat)[1]
-    
-    def counter(score1, score2):
-        '''Optimal counter strategy against strat'''
-        return counter_table[score1][score2]
-    
-    return counter, counter_table, sim_counter(0, 0, strat)[0]
+    counter_table, counter_rates, _ = counter_solution(Strategy.from_callable(strat, rules.size), rules)
+    counter = Strategy(counter_table)
+    return counter, counter.table, float(counter_rates[0][0])
+
+@profiled
+def solve_responses(tables, state_weights = None, rules = default_rules):
+    '''Solves for counter strategies against several roll tables in one pass over the score-sum diagonals, sharing
+       the dice and rule tables between all of them.
+
+       Args:
+           tables (array-like): The opponents' roll tables, indexed by [opponent][score1][score2]
+           state_weights (array-like): If None, each opponent gets its own optimal counter. Otherwise a single counter
+                                       is built, rolling at each pair of scores to maximize the sum of the win rates
+                                       against every opponent, weighted by [opponent][score1][score2]
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The counters' roll tables, the counters' win rates when they are
+                                                         about to move, and the opponents' win rates when they are about
+                                                         to move, all indexed by [opponent][mover's score][other score].
+                                                         With state_weights, there is only one roll table
+    '''
+    size = rules.size
+    tables = numpy.asarray(tables).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    counter_tables = numpy.zeros((len(tables) if state_weights is None else 1, size, size), dtype=numpy.uint8)
+    counter_rates = numpy.zeros((len(tables), size * size + 1), dtype=rules.dtype)  # The extra entries are the rates after the other player has won
+    opponent_rates = numpy.zeros((len(tables), size * size + 1), dtype=rules.dtype)
+    for total in range(2 * rules.max_score, -1, -1):
+        score1, score2, next_index = memoized_for(score_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        roll_rates = (probs[:, score2] * (1 - opponent_rates[:, None, next_index])).sum(axis=-1)  # [opponent][roll][state]
+        if state_weights is None:
+            combined_rates = roll_rates
+        else:
+            combined_rates = (roll_rates * state_weights[:, None, score1, score2]).sum(axis=0, keepdims=True)
+        best_rates = combined_rates.max(axis=1, keepdims=True)
+        rolls = (combined_rates >= best_rates - tie_tolerance).argmax(axis=1)  # Ties go to the fewest dice
+        counter_tables[:, score1, score2] = rolls
+        counter_rates[:, flat] = numpy.take_along_axis(roll_rates, numpy.broadcast_to(rolls, (len(tables), len(flat)))[:, None], axis=1)[:, 0]
+        freqs = probs[tables[:, score1, score2], score2]
+        opponent_rates[:, flat] = (freqs * (1 - counter_rates[:, next_index])).sum(axis=-1)
+    count_states(2 * len(tables) * size * size)
+    return counter_tables, counter_rates[:, :-1].reshape(-1, size, size), opponent_rates[:, :-1].reshape(-1, size, size)
+
+def create_counters(strats, rules = default_rules):
+    '''Creates the optimal counter strategy against each of strats in a single batch
 
-def learn(iterations = 12, seed = lambda x, y: 4):
+       Args:
+           strats (list): The strategies to be countered
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
+
+        Returns:
+            list: A tuple for each strategy of its optimal counter, the counter's lookup table, and the counter's
+                  win rate when it moves first, as returned by create_counter
+    '''
+    counter_tables, counter_rates, _ = solve_responses([Strategy.from_callable(strat, rules.size).table for strat in strats],
+                                                       rules=rules)
+    counters = [Strategy(table) for table in counter_tables]
+    return [(counter, counter.table, float(rates[0][0])) for counter, rates in zip(counters, counter_rates)]
+
+@profiled
+def solve_q_values(table, policy = None, rules = default_rules):
+    '''Solves for the win rate of every roll at every pair of scores against a roll table, in one pass over the
+       score-sum diagonals. This is the table of all rolls that solve_counter takes the best of.
+
+       Args:
+           table (array-like): The opponent's roll table, indexed by [score1][score2]
+           policy (array-like): The roll table followed after the first roll. If None, every later roll is the
+                                best one, so the rates are those of the optimal counter after each first roll
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The win rate of each first roll, indexed by
+                [mover's score][other score][roll], the rates of the policy (or the optimal counter) and the
+                opponent's rates when about to move, indexed by [mover's score][other score]
+    '''
+    size = rules.size
+    table = numpy.asarray(table).astype(numpy.intp)
+    if policy is not None:
+        policy = numpy.asarray(policy).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    q_values = numpy.zeros((size * size, rules.max_dice + 1), dtype=rules.dtype)
+    mover_rates = numpy.zeros(size * size + 1, dtype=rules.dtype)  # The extra entries are the rates after the other player has won
+    opponent_rates = numpy.zeros(size * size + 1, dtype=rules.dtype)
+    for total in range(2 * rules.max_score, -1, -1):
+        score1, score2, next_index = memoized_for(score_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        roll_rates = (probs[:, score2] * (1 - opponent_rates[next_index])).sum(axis=-1)  # [roll][state]
+        q_values[flat] = roll_rates.T
+        if policy is None:
+            mover_rates[flat] = roll_rates.max(axis=0)
+        else:
+            mover_rates[flat] = roll_rates[policy[score1, score2], numpy.arange(len(flat))]
+        freqs = probs[table[score1, score2], score2]
+        opponent_rates[flat] = (freqs * (1 - mover_rates[next_index])).sum(axis=-1)
+    count_states(2 * size * size)
+    return q_values.reshape(size, size, -1), mover_rates[:-1].reshape(size, size), opponent_rates[:-1].reshape(size, size)
+
+@memoize(maxsize = 64)
+def q_value_solution(strat, policy = None, rules = default_rules):
+    '''Memoized solve_q_values for Strategy objects, kept in the active result store if there is one'''
+    strategies = (strat,) if policy is None else (strat, policy)
+    return cached('q_values', strategies, lambda: solve_q_values(strat.table, None if policy is None else policy.table, rules), rules)
+
+def q_values(strat, policy = None, rules = default_rules):
+    '''Returns the win rate of every roll at every pair of scores against strat, see solve_q_values
+
+       Args:
+           strat (strategy function): The opponent
+           policy (strategy function): The strategy followed after the first roll, or None to play optimally
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
+
+        Returns:
+            numpy.ndarray: The win rates, indexed by [score1][score2][roll]
+    '''
+    policy = None if policy is None else Strategy.from_callable(policy, rules.size)
+    return q_value_solution(Strategy.from_callable(strat, rules.size), policy, rules)[0]
+
+def roll_regret(q_values):
+    '''Returns how much less each roll wins than the best roll, from an array of win rates with rolls on the last axis'''
+    return q_values.max(axis=-1, keepdims=True) - q_values
+
+def cell_regret(q_values, table):
+    '''Returns how much less the roll in each cell of a roll table wins than the best roll, see roll_regret
+
+       Args:
+           q_values (numpy.ndarray): Win rates with rolls on the last axis, as returned by q_values
+           table (array-like): A roll for each state, with the shape of q_values without its last axis
+
+        Returns:
+            numpy.ndarray: The regret of each cell
+    '''
+    table = numpy.broadcast_to(numpy.asarray(table).astype(numpy.intp), q_values.shape[:-1])
+    return numpy.take_along_axis(roll_regret(q_values), table[..., None], axis=-1)[..., 0]
+
+def top_two_margin(q_values):
+    '''Returns how much more the best roll wins than the second best in each state, so that small margins
+       show where a table could be changed cheaply'''
+    top_two = numpy.partition(q_values, -2, axis=-1)[..., -2:]
+    return top_two[..., 1] - top_two[..., 0]
+
+def regret(strat, opponent, rules = default_rules):
+    '''Returns how much strat could gain at each pair of scores by changing only that cell of its table, against
+       opponent, indexed by [score1][score2]'''
+    strat = Strategy.from_callable(strat, rules.size)
+    return cell_regret(q_values(opponent, strat, rules), strat.table)
+
+def simplification_cost(strat, opponent, simplified, rules = default_rules):
+    '''Measures what is lost by replacing strat with a simpler table against opponent. The cost of each cell is the
+       win rate lost by making the simplified roll there once and then playing strat. Weighting those costs by how
+       often the simplified strategy reaches each cell gives the exact drop in expected win rate.
+
+       Args:
+           strat (strategy function): The strategy to simplify
+           opponent (strategy function): The strategy played against
+           simplified (strategy function): The simplified strategy
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, float: The cost of each cell, indexed by [score1][score2], and the drop in expected
+                                  win rate against opponent
+    '''
+    strat, simplified, opponent = (Strategy.from_callable(s, rules.size) for s in (strat, simplified, opponent))
+    q = q_values(opponent, strat, rules)
+    costs = cell_regret(q, simplified.table) - cell_regret(q, strat.table)
+    return costs, float((occupancy(simplified, opponent, rules)[0] * costs).sum())
+
+@profiled
+def solve_population_counter(tables, weights, max_passes = 20, rules = default_rules):
+    '''Solves for a single counter strategy that maximizes its weighted expected win rate against several roll tables.
+       The choice at each pair of scores trades off the opponents by how often that pair is reached against each of
+       them, which in turn depends on the counter. Passes alternate between weighting by the occupancy of the last
+       counter and solving for the next, until the counter stops changing. The result cannot be improved by changing
+       the roll at any single pair of scores, and is the optimal counter when there is only one opponent.
+
+       Args:
+           tables (array-like): The opponents' roll tables, indexed by [opponent][score1][score2]
+           weights (array-like): The weight of each opponent
+           max_passes (int): The most counters solved before the best one found is returned
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, float, numpy.ndarray: The counter's roll table, its weighted expected win rate, and its
+                                                 expected win rate against each opponent
+    '''
+    tables = numpy.asarray(tables).astype(numpy.intp)
+    weights = numpy.asarray(weights, dtype=float) / numpy.sum(weights)
+    state_weights = numpy.broadcast_to(weights[:, None, None], tables.shape)  # The first pass ignores occupancy
+    best_table, best_rate, best_rates, last_table = None, -1, None, None
+    for _ in range(max_passes):
+        counter_tables, counter_rates, opponent_rates = solve_responses(tables, state_weights, rules)
+        counter_table = counter_tables[0]
+        if last_table is not None and (counter_table == last_table).all():
+            break
+        rates = (counter_rates[:, 0, 0] + 1 - opponent_rates[:, 0, 0]) / 2
+        if rates @ weights > best_rate:
+            best_table, best_rate, best_rates = counter_table, float(rates @ weights), rates
+        frequencies = numpy.stack([solve_occupancy(counter_table, table, rules)[0] for table in tables])
+        unreached = frequencies.sum(axis=0) == 0  # Pairs of scores no opponent leads to fall back to the plain weights
+        state_weights = weights[:, None, None] * numpy.where(unreached, 1, frequencies)
+        last_table = counter_table
+    return best_table, best_rate, best_rates
+
+def create_population_counter(population, max_passes = 20, rules = default_rules):
+    '''Creates a counter strategy against a weighted population of opponents, see solve_population_counter
+
+       Args:
+           population (list): Pairs of an opponent strategy and its weight
+           max_passes (int): See solve_population_counter
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
+
+        Returns:
+            Strategy, numpy.ndarray, float: The counter strategy, its lookup table, and its weighted expected win rate
+    '''
+    tables = [Strategy.from_callable(strat, rules.size).table for strat, _ in population]
+    counter_table, rate, _ = solve_population_counter(tables, [weight for _, weight in population], max_passes, rules)
+    counter = Strategy(counter_table)
+    return counter, counter.table, rate
+
+def learn_iterations(iterations = 12, seed = lambda x, y: 4, tolerance = 1e-12, evaluate = True, rules = default_rules,
+                     resume = None, snapshot = None):
+    '''Creates progressively better strategies by creating counter strategies from previous strategies. Each
+       counter is solved warm started from the solution against the strategy before it, so only the diagonals
+       at or below the highest changed cell are solved again.
+
+       Args:
+            iterations (int): The number of counter strategies created after the first
+            seed (function): The initial strategy used to create the counter in the first iteration
+            tolerance (float): Learning stops early once a counter's rate changes by no more than this, or once
+                               a counter is the same as the strategy it counters
+            evaluate (bool): False to leave expected_rate as None, for callers that evaluate counters elsewhere
+            rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
+            resume (LearnState): A state passed to snapshot, to continue from instead of the seed
+            snapshot (function): Called with a LearnState and None after each diagonal of a solve, and with the
+                                 LearnState of the next iteration and the LearnRecord of this one before the record
+                                 is yielded, to checkpoint the run
+
+        Yields:
+            LearnRecord: The counter created in each iteration, with its rate and timing
+    '''
+    if resume is None:
+        resume = LearnState(0, Strategy.from_callable(seed, rules.size), None, None, None, False)
+    if resume.finished:
+        return
+    strat, warm_start, last_rate, partial = resume.strategy, resume.warm_start, resume.last_rate, resume.partial
+    for iteration in range(resume.iteration, iterations + 1):
+        start = time.perf_counter()
+        progress = None
+        if snapshot is not None:
+            progress = lambda total, arrays: snapshot(LearnState(iteration, strat, warm_start, last_rate, (total, arrays), False), None)
+        solution = cached('counter', (strat,), lambda: solve_counter(strat.table, warm_start, rules, partial, progress), rules)
+        partial = None
+        counter = Strategy(solution[0])
+        rate = float(solution[1][0][0])
+        changed_cells = int(numpy.count_nonzero(counter.table != strat.table))
+        expected_rate = expected_win_rate(counter, strat, rules) if evaluate else None
+        record = LearnRecord(iteration, counter, rate, expected_rate, changed_cells, time.perf_counter() - start)
+        finished = not changed_cells or (last_rate is not None and abs(rate - last_rate) <= tolerance)
+        strat, warm_start, last_rate = counter, (strat.table, solution), rate
+        if snapshot is not None:
+            snapshot(LearnState(iteration + 1, strat, warm_start, last_rate, None, finished), record)
+        yield record
+        if finished:
+            return
+
+@profiled
+def learn(iterations = 12, seed = lambda x, y: 4, tolerance = 1e-12, rules = default_rules):
     '''Creates progressively better strategies by creating counter strategies from previous strategies.
+       See learn_iterations for the record of each iteration.
        
        Args:
-            iterations (int): The number of counter strategies created
+            iterations (int): The number of counter strategies created after the first
             seed (function): The initial strategy used to create the counter in the first iteration
+            tolerance (float): See learn_iterations
+            rules (RuleSet): The goal and dice of the game
         
         Returns:
-            function, list, float: Function created
+            Strategy, numpy.ndarray, float: The last counter created, its lookup table, and its win rate when it moves first
     
     '''
-    counter = create_counter(seed)
-    if iterations:
-        print("Iterations Left: {:>2}, Rate: {}".format(iterations, counter[2]))
-        clear_memos()
-        return learn(iterations - 1, counter[0])
-    return counter
+    for record in learn_iterations(iterations, seed, tolerance, rules=rules):
+        pass
+    return record.strategy, record.strategy.table, record.rate
 
 def human_strat(score1, score2):
     '''A simple but effective Hog strategy'''
@@ -273,24 +688,52 @@ def play(strat1, strat2, score1 = 0, score2 = 0):
     if is_swap(score1, score2): score1, score2 = score2, score1
     return 1 - play(strat2, strat1, score2, score1)
 
-def average_win_rate(strat1, strat2, matches = 1000):
-    '''Calculates the average win rate of strat1 for matches amount of games between strat1 and strat2'''
-    first_turn  = sum([play(strat1, strat2) for _ in range(matches//2)])
-    second_turn = matches//2 - sum([play(strat2, strat1) for _ in range(matches//2)])
-    return (first_turn + second_turn)/matches
+def average_win_rate(strat1, strat2, matches = 1000, seed = None):
+    '''Calculates the average win rate of strat1 for matches amount of games between strat1 and strat2.
+       The games are played in lockstep by monte_carlo, with dice drawn from a generator seeded by seed.'''
+    return monte_carlo.average_win_rate(strat1, strat2, matches, seed)
 
-@memoize
-def expected_frequency(strat1, strat2, score1, score2):
-    '''Calculates the expected frequency of a turn taking place in a given game.'''
-    if score1 == 0:
-        if score2 == 0: return 0.5
-    if is_swap(score1, score2): score1, score2 = score2, score1
-    total_freq = 0
-    for i in range(1, 61):
-        prev_score2 = score2 - i
-        if prev_score2 >= 0:
-            num_rolls = strat2(prev_score2, score1)
-            freqs = get_frequencies(num_rolls, score1)
-            if i in freqs:
-                total_freq += expected_frequency(strat2, strat1, prev_score2, score1) * freqs[i]
-    return total_freq
\ No newline at end of file
+def estimate_win_rate(strat1, strat2, precision = 0.01, threshold = None, seed = None, **options):
+    '''Estimates the win rate of strat1 against strat2 from as few games as needed for the precision or the decision
+       asked for, see monte_carlo.estimate_win_rate for the options.'''
+    return monte_carlo.estimate_win_rate(strat1, strat2, precision, threshold, seed=seed, **options)
+
+@profiled
+def solve_occupancy(table1, table2, rules = default_rules):
+    '''Calculates the expected frequency of every turn in a game between two strategies in one forward pass.
+       Each player moves first half the time, and probability mass is pushed from every state to the states
+       that can follow it, one score-sum diagonal at a time, starting from the opening state.
+
+       Args:
+           table1 (array-like): Player 1's roll table, indexed by [score1][score2]
+           table2 (array-like): Player 2's roll table, indexed by [score2][score1]
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: Arrays where [score1][score2] is expected_frequency(strat1, strat2, score1, score2)
+                                          and [score2][score1] is expected_frequency(strat2, strat1, score2, score1)
+
+    '''
+    size = rules.size
+    tables = numpy.stack([numpy.asarray(table1), numpy.asarray(table2)]).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    frequencies = numpy.zeros((2, size * size + 1), dtype=rules.dtype)  # The extra entry collects the mass of finished games
+    frequencies[:, 0] = 0.5
+    for total in range(2 * rules.max_score + 1):
+        score1, score2, next_index = memoized_for(score_diagonal, rules)(total, rules)
+        for player in (0, 1):
+            mass = frequencies[player, score1 * size + score2, None] * probs[tables[player, score1, score2], score2]
+            frequencies[1 - player] += numpy.bincount(next_index.ravel(), mass.ravel(), minlength=size * size + 1)
+    count_states(2 * size * size)
+    return frequencies[0, :-1].reshape(size, size), frequencies[1, :-1].reshape(size, size)
+
+@memoize(maxsize = 1024)
+def occupancy(strat1, strat2, rules = default_rules):
+    '''Memoized solve_occupancy for a pair of Strategy objects'''
+    return solve_occupancy(strat1.table, strat2.table, rules)
+
+@profiled
+def expected_frequency(strat1, strat2, score1, score2, rules = default_rules):
+    '''Calculates the expected frequency of a turn taking place in a given game, played by rules.'''
+    frequencies = occupancy(Strategy.from_callable(strat1, rules.size), Strategy.from_callable(strat2, rules.size), rules)[0]
+    return float(frequencies[score1][score2])
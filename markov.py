@@ -0,0 +1,168 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Evaluate a pair of strategies as an absorbing Markov chain, solving one sparse linear system for the
+         win rates, expected game length and Swine Swap statistics from every state. This is independent of the
+         diagonal solvers in hog_sim and trot_sim, so each can be used to check the other.
+'''
+from collections import namedtuple
+from hog_rules import default_rules
+from strategy import Strategy, TrotStrategy
+from profiling import profiled, count_states
+import numpy
+import scipy.sparse
+import scipy.sparse.linalg
+
+# rates holds the two arrays returned by hog_sim.solve_game or trot_sim.solve_game. The other statistics are indexed
+# the same way, with a leading [player] axis, and count the turns or Swine Swaps left in the game from each state.
+# swap_probability is the chance that at least one Swine Swap happens. turn_distribution[n] is the probability that a
+# game lasts exactly n turns, with each player moving first half the time
+ChainAnalysis = namedtuple('ChainAnalysis', ['rates', 'expected_turns', 'expected_swaps', 'swap_probability', 'turn_distribution'])
+
+def score_transitions(rules = default_rules):
+    '''Tabulates where each state leads after each number of points
+
+       Args:
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray: For every flat state and 1 to rules.max_points points,
+                whether the mover won, whether the scores were swapped, and the flat index of the state the opponent
+                moves from next and of the state the mover moves from after time trotting
+    '''
+    size = rules.size
+    score1, score2 = numpy.divmod(numpy.arange(size * size), size)
+    new_score1 = score1[:, None] + numpy.arange(1, rules.max_points + 1)
+    won = new_score1 > rules.max_score
+    bounded = numpy.minimum(new_score1, rules.max_score)
+    swapped = rules.swap_matrix[bounded, score2[:, None]] & ~won
+    next_index = numpy.where(swapped, bounded * size + score2[:, None], score2[:, None] * size + bounded)
+    trot_index = numpy.where(swapped, score2[:, None] * size + bounded, bounded * size + score2[:, None])
+    return won, swapped, next_index, trot_index
+
+def state_order(size = default_rules.size):
+    '''Ranks the flat states by the sum of their scores. Every turn leads to a higher sum, so numbering states
+       by rank makes the transition matrix strictly upper triangular and the sparse solve free of fill in.
+    '''
+    totals = numpy.add.outer(numpy.arange(size), numpy.arange(size)).ravel()
+    rank = numpy.empty(size * size, dtype=numpy.intp)
+    rank[numpy.argsort(totals, kind='stable')] = numpy.arange(size * size)
+    return rank
+
+def build_chain(tables, trot = False, rules = default_rules):
+    '''Builds the transient part of the chain for two roll tables
+
+       Args:
+           tables (list): Player 1's and player 2's roll tables, indexed by [score1][score2], or by
+                          [score1][score2][turn][can_trot] if trot is True
+           trot (bool): True to play with the Time Trot rule of trot_sim
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            scipy.sparse.csr_matrix, scipy.sparse.csr_matrix, numpy.ndarray, numpy.ndarray: The transition matrix
+                between transient states, the same matrix without the transitions that swap the scores, the
+                probability that player 1 and player 2 win on the next turn from each state, and the probability
+                of a Swine Swap on the next turn from each state
+    '''
+    size = rules.size
+    won, swapped, next_index, trot_index = score_transitions(rules)
+    rank = state_order(size)
+    flats = numpy.arange(size * size)
+    score2 = flats % size
+    layers = 32 if trot else 2  # Chain states per pair of scores: [player][can_trot][turn] or [player]
+    num_states = size * size * layers
+    rows, cols, data, swaps = [], [], [], []
+    wins = numpy.zeros((num_states, 2))
+    for player in (0, 1):
+        for can_trot in ((0, 1) if trot else (0,)):
+            for turn in (range(8) if trot else (0,)):
+                if trot:
+                    rolls = tables[player][:, :, turn, can_trot].ravel()
+                    trotted = can_trot and rolls == turn
+                    state = rank[flats] * layers + (player * 2 + can_trot) * 8 + turn
+                    passed = rank[next_index] * layers + ((1 - player) * 2 + 1) * 8 + (turn + 1) % 8
+                    stayed = rank[trot_index] * layers + player * 2 * 8 + (turn + 1) % 8
+                    destination = numpy.where(numpy.reshape(trotted, (-1, 1)), stayed, passed)
+                else:
+                    rolls = tables[player].ravel()
+                    state = rank[flats] * layers + player
+                    destination = rank[next_index] * layers + 1 - player
+                freqs = rules.turn_outcomes[rolls, score2, 1:]
+                wins[state, player] = (freqs * won).sum(axis=1)
+                moving = (freqs > 0) & ~won
+                rows.append(numpy.broadcast_to(state[:, None], moving.shape)[moving])
+                cols.append(destination[moving])
+                data.append(freqs[moving])
+                swaps.append(swapped[moving])
+    rows, cols, data, swaps = map(numpy.concatenate, (rows, cols, data, swaps))
+    transitions = scipy.sparse.csr_matrix((data, (rows, cols)), shape=(num_states, num_states))
+    unswapped = scipy.sparse.csr_matrix((data[~swaps], (rows[~swaps], cols[~swaps])), shape=(num_states, num_states))
+    swap_steps = numpy.bincount(rows[swaps], data[swaps], minlength=num_states)
+    return transitions, unswapped, wins, swap_steps
+
+@profiled
+def solve_chain(table1, table2, trot = False, rules = default_rules):
+    '''Solves the absorbing Markov chain of a game between two roll tables. A single sparse factorization gives the
+       win rates, expected turns and expected Swine Swaps from every state, and one more triangular solve gives
+       the chance that a Swine Swap happens at all.
+
+       Args:
+           table1 (array-like): Player 1's roll table, see build_chain
+           table2 (array-like): Player 2's roll table
+           trot (bool): True to play with the Time Trot rule of trot_sim
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            ChainAnalysis: The statistics of the game from every state
+    '''
+    size = rules.size
+    tables = [numpy.asarray(table).astype(numpy.intp) for table in (table1, table2)]
+    transitions, unswapped, wins, swap_steps = build_chain(tables, trot, rules)
+    num_states = transitions.shape[0]
+    identity = scipy.sparse.identity(num_states, format='csc')
+    solver = scipy.sparse.linalg.splu((identity - transitions).tocsc(), permc_spec='NATURAL')
+    solution = solver.solve(numpy.column_stack([wins[:, 0], numpy.ones(num_states), swap_steps]))
+    # Dropping the swapping transitions leaves the chance of finishing the game without one
+    no_swap = scipy.sparse.linalg.splu((identity - unswapped).tocsc(), permc_spec='NATURAL').solve(wins.sum(axis=1))
+    count_states(num_states)
+
+    # Turn lengths, following the probability of still playing from the opening states turn by turn
+    layers = num_states // (size * size)
+    opening = numpy.zeros(num_states)
+    opening[[(player * 2 + 1) * 8 if trot else player for player in (0, 1)]] = 0.5
+    finishing = wins.sum(axis=1)
+    turn_distribution = [0]
+    while opening.sum() > 1e-15:
+        turn_distribution.append(opening @ finishing)
+        opening = transitions.T @ opening
+
+    rank = state_order(size)
+    def by_state(values):
+        '''Rearranges values of chain states into [player][score1][score2], with [turn][can_trot] appended for Time Trot'''
+        values = values.reshape(size * size, layers)[rank]
+        if trot:
+            return values.reshape(size, size, 2, 2, 8).transpose(2, 0, 1, 4, 3)
+        return values.reshape(size, size, 2).transpose(2, 0, 1)
+    player1_wins = by_state(solution[:, 0])
+    rates = (player1_wins[0], 1 - player1_wins[1])
+    return ChainAnalysis(rates, by_state(solution[:, 1]), by_state(solution[:, 2]), by_state(1 - no_swap),
+                         numpy.array(turn_distribution))
+
+def analyze(strat1, strat2, trot = False, rules = default_rules):
+    '''Solves the Markov chain of a game between two strategies, see solve_chain
+
+       Args:
+           strat1 (strategy function): Player 1's strategy
+           strat2 (strategy function): Player 2's strategy
+           trot (bool): True to play with the Time Trot rule of trot_sim
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            ChainAnalysis: The statistics of the game from every state
+    '''
+    strats = [Strategy.from_callable(strat, rules.size) for strat in (strat1, strat2)]
+    if trot:
+        strats = [TrotStrategy.from_callable(strat, rules.size) for strat in strats]
+    return solve_chain(strats[0].table, strats[1].table, trot, rules)
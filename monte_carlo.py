@@ -0,0 +1,217 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Play large batches of games of Hog with random, fair dice, advancing every game in lockstep as arrays
+         so that the exact solvers can be cross-checked against millions of simulated games
+'''
+from collections import namedtuple
+from hog_rules import default_rules
+from strategy import Strategy, TrotStrategy
+from statistics import NormalDist
+import math
+import numpy
+
+batch_size = 1 << 18  # Games simulated at once, which bounds the memory used by the dice
+
+# The result of estimate_win_rate: the observed win rate of strat1, the bounds of its Wilson score interval, the
+# games played, and whether strat1 wins more often than the threshold, which is None if that was left undecided
+Estimate = namedtuple('Estimate', ['rate', 'low', 'high', 'games', 'better'])
+
+def roll_points(rolls, other_scores, rng, rules = default_rules):
+    '''Rolls dice for many turns at once and returns the points scored on each
+
+       Args:
+           rolls (numpy.ndarray): The number of dice rolled on each turn
+           other_scores (numpy.ndarray): The opposing player's score on each turn, used for Free Bacon
+           rng (numpy.random.Generator): Source of the dice rolls
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray: The points scored on each turn
+    '''
+    points = rules.free_bacon_points[other_scores]
+    rolling = numpy.flatnonzero(rolls)
+    pig_out = rng.random(len(rolling)) >= pow((rules.sides - 1) / rules.sides, rolls[rolling])  # At least one die came up 1
+    points[rolling[pig_out]] = 1
+    scoring = rolling[~pig_out]
+    if len(scoring):  # With no 1s, every die is uniform over 2 to rules.sides
+        num_dice = rolls[scoring]
+        dice = rng.integers(2, rules.sides + 1, size=(len(scoring), num_dice.max()), dtype=numpy.int8)
+        points[scoring] = (dice * (numpy.arange(num_dice.max()) < num_dice[:, None])).sum(axis=1)
+    return points
+
+def simulate(tables, first, rng, trot = False, rules = default_rules):
+    '''Plays one game for every entry of first, taking a turn in every unfinished game at each step
+
+       Args:
+           tables (numpy.ndarray): 2x(max_score + 1)x(max_score + 1) roll tables of player 0 and player 1, or
+                                   2x(max_score + 1)x(max_score + 1)x8x2 tables that also depend on the turn
+           first (numpy.ndarray): The player who moves first in each game
+           rng (numpy.random.Generator): Source of the dice rolls
+           trot (bool): True to play with the Time Trot rule of trot_sim, False for the rules of hog_sim
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray: The winning player of each game
+    '''
+    winners = numpy.empty(len(first), dtype=numpy.int8)
+    games = numpy.arange(len(first))
+    mover = numpy.array(first, dtype=numpy.int8)
+    mover_score = numpy.zeros(len(first), dtype=numpy.int16)
+    other_score = numpy.zeros(len(first), dtype=numpy.int16)
+    turn = numpy.zeros(len(first), dtype=numpy.int8)
+    can_trot = numpy.ones(len(first), dtype=bool)
+    while len(games):
+        if tables.ndim == 3:
+            rolls = tables[mover, mover_score, other_score]
+        else:
+            rolls = tables[mover, mover_score, other_score, turn, can_trot.astype(numpy.intp)]
+        mover_score = mover_score + roll_points(rolls, other_score, rng, rules)
+        won = mover_score > rules.max_score
+        winners[games[won]] = mover[won]
+        playing = ~won
+        games, mover, rolls, turn, can_trot = games[playing], mover[playing], rolls[playing], turn[playing], can_trot[playing]
+        mover_score, other_score = mover_score[playing], other_score[playing]
+        swapped = rules.swap_matrix[mover_score, other_score]
+        mover_score, other_score = numpy.where(swapped, other_score, mover_score), numpy.where(swapped, mover_score, other_score)
+        trotted = can_trot & (rolls == turn) if trot else numpy.zeros(len(games), dtype=bool)
+        turn, can_trot = (turn + 1) % 8, ~trotted
+        mover = numpy.where(trotted, mover, 1 - mover)
+        mover_score, other_score = numpy.where(trotted, mover_score, other_score), numpy.where(trotted, other_score, mover_score)
+    return winners
+
+def play_games(strat1, strat2, first, seed = None, trot = False, rules = default_rules):
+    '''Plays a game between strat1 and strat2 for every entry of first, in batches of batch_size
+
+       Args:
+           strat1 (strategy function): Player 0's strategy
+           strat2 (strategy function): Player 1's strategy
+           first (array-like): The player who moves first in each game
+           seed (int or numpy.random.Generator): Seed for the dice
+           trot (bool): True to play with the Time Trot rule
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray: True for each game won by strat1
+    '''
+    rng = numpy.random.default_rng(seed)
+    strats = [Strategy.from_callable(strat, rules.size) for strat in (strat1, strat2)]
+    if any(isinstance(strat, TrotStrategy) for strat in strats):
+        strats = [TrotStrategy.from_callable(strat, rules.size) for strat in strats]
+    tables = numpy.stack([strat.table for strat in strats])
+    first = numpy.asarray(first)
+    return numpy.concatenate([simulate(tables, first[start:start + batch_size], rng, trot, rules) == 0
+                              for start in range(0, len(first), batch_size)] or [numpy.zeros(0, dtype=bool)])
+
+def average_win_rate(strat1, strat2, num_matches = 1000, seed = None, trot = False, rules = default_rules):
+    '''Calculates the average win rate of strat1 over num_matches games, with each strategy moving first in half'''
+    first = numpy.repeat([0, 1], num_matches // 2)
+    return float(play_games(strat1, strat2, first, seed, trot, rules).sum() / num_matches)
+
+def wilson_interval(wins, games, confidence = 0.95):
+    '''Returns the Wilson score interval of a win rate, which stays inside [0, 1] and keeps its coverage for rates
+       near 0 or 1, unlike the normal approximation
+
+       Args:
+           wins (int): Games won
+           games (int): Games played
+           confidence (float): Probability that the interval covers the true win rate
+
+        Returns:
+            float, float: The lower and upper bounds of the interval
+    '''
+    if not games:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = wins / games
+    center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+    spread = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - spread), min(1.0, center + spread)
+
+def sprt_bounds(threshold, indifference):
+    '''Returns the win rates below and above threshold that sprt_decision separates, raising ValueError unless
+       both are strictly between 0 and 1 and indifference is positive'''
+    low, high = threshold - indifference, threshold + indifference
+    if not 0 < low < high < 1:
+        raise ValueError('threshold - indifference and threshold + indifference must be strictly between 0 and 1 '
+                         'with indifference positive, not {} and {}'.format(low, high))
+    return low, high
+
+def sprt_decision(wins, games, threshold = 0.5, indifference = 0.01, confidence = 0.95):
+    '''Wald's sequential probability ratio test of whether a win rate is above threshold + indifference or below
+       threshold - indifference, with both error rates at most 1 - confidence
+
+        Returns:
+            bool: True if the rate is above the threshold, False if below, None if more games are needed
+    '''
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be strictly between 0 and 1, not {}'.format(confidence))
+    low, high = sprt_bounds(threshold, indifference)
+    ratio = wins * math.log(high / low) + (games - wins) * math.log((1 - high) / (1 - low))
+    error = 1 - confidence
+    if ratio >= math.log((1 - error) / error):
+        return True
+    if ratio <= math.log(error / (1 - error)):
+        return False
+    return None
+
+def estimate_win_rate(strat1, strat2, precision = 0.01, threshold = None, confidence = 0.95, method = 'wilson',
+                      indifference = 0.01, batch = 1000, max_matches = 1 << 22, seed = None, trot = False,
+                      rules = default_rules):
+    '''Plays games between strat1 and strat2 in batches, each player moving first in half of every batch, and stops
+       as soon as the win rate of strat1 is known to within precision or is decided to be above or below threshold.
+       Batches grow with the games played, so that a close matchup is not checked after every few thousand games.
+
+       Args:
+           strat1 (strategy function): The strategy whose win rate is estimated
+           strat2 (strategy function): Its opponent
+           precision (float): Stop once the half width of the Wilson interval is at most this, None to only decide
+           threshold (float): Stop once strat1's win rate is decided to be above or below this, None to only estimate
+           confidence (float): Confidence of the interval, and of the decision
+           method (str): 'wilson' decides once a Wilson interval excludes threshold. Since the decision is checked
+                         after every batch, check k uses an interval at confidence 1 - (1 - confidence) / 2**k, so
+                         the errors of all checks together stay within 1 - confidence. A rate at exactly threshold
+                         is never decided, and with precision None only stops at max_matches. 'sprt' uses
+                         sprt_decision, which is valid under repeated checks, settles close matchups in fewer games
+                         and stops at any rate, but cannot separate rates within indifference
+           indifference (float): See sprt_decision
+           batch (int): The fewest games played between checks
+           max_matches (int): The most games played, after which the matchup is left undecided
+           seed (int or numpy.random.Generator): Seed for the dice
+           trot (bool): True to play with the Time Trot rule
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            Estimate: The win rate of strat1, its Wilson interval, the games played and the decision
+    '''
+    assert precision is not None or threshold is not None, "Nothing to stop on"
+    assert method in ('wilson', 'sprt'), "Unknown method"
+    if max_matches < 2:
+        raise ValueError('max_matches must be at least 2, one game with each player moving first, not {}'.format(max_matches))
+    if batch < 2:
+        raise ValueError('batch must be at least 2, not {}'.format(batch))
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be strictly between 0 and 1, not {}'.format(confidence))
+    if method == 'sprt' and threshold is not None:
+        sprt_bounds(threshold, indifference)
+    rng = numpy.random.default_rng(seed)
+    strats = [Strategy.from_callable(strat, rules.size) for strat in (strat1, strat2)]
+    wins = games = checks = 0
+    while True:
+        played = min(max(batch, games // 2), max_matches - games) // 2
+        wins += int(play_games(strats[0], strats[1], numpy.repeat([0, 1], played), rng, trot, rules).sum())
+        games += 2 * played
+        checks += 1
+        low, high = wilson_interval(wins, games, confidence)
+        better = None
+        if threshold is not None:
+            if method == 'sprt':
+                better = sprt_decision(wins, games, threshold, indifference, confidence)
+            else:
+                lowest, highest = wilson_interval(wins, games, 1 - (1 - confidence) / 2 ** checks)
+                if lowest > threshold or highest < threshold:
+                    better = lowest > threshold
+        if better is not None or (precision is not None and high - low <= 2 * precision) or games + 2 > max_matches:
+            return Estimate(wins / games, low, high, games, better)
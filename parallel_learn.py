@@ -0,0 +1,179 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Run learn from many seeds at once across a pool of worker processes. The rule tables, the score-sum
+         diagonals and the seed tables are placed in shared memory once, so every worker reads the same copy
+         instead of rebuilding its own, and each iteration is streamed back to the parent as soon as it finishes.
+'''
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from strategy import Strategy
+import multiprocessing
+import queue
+import numpy
+import hog_rules
+import hog_sim
+import trot_sim
+
+# One iteration of one run: the position of its seed in the list given to learn_seeds, and its LearnRecord
+SeedRecord = namedtuple('SeedRecord', ['seed', 'record'])
+
+class SharedArrays:
+    '''A set of named numpy arrays packed into one block of shared memory. The object pickles as the name and
+       layout of the block, so workers can attach to it and read the arrays without copying them.
+    '''
+    def __init__(self, arrays):
+        '''
+           Args:
+               arrays (dict): The arrays to share, by name
+        '''
+        self.layout, offset = [], 0
+        for name, array in arrays.items():
+            array = numpy.ascontiguousarray(array)
+            offset = -(-offset // 64) * 64  # Aligned for any dtype
+            self.layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        self.memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.owner = True
+        for (name, _, _, _), view in zip(self.layout, self.views().values()):
+            view[...] = arrays[name]
+
+    def views(self):
+        '''Returns read only views of the arrays, by name'''
+        views = {}
+        for name, dtype, shape, offset in self.layout:
+            view = numpy.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            view.flags.writeable = self.owner
+            views[name] = view
+        return views
+
+    def __getstate__(self):
+        return {'name': self.memory.name, 'layout': self.layout}
+
+    def __setstate__(self, state):
+        self.memory = shared_memory.SharedMemory(name=state['name'])
+        self.layout, self.owner = state['layout'], False
+
+    def close(self):
+        '''Releases the block, freeing it if this process created it'''
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+rule_arrays = ('free_bacon_points', 'outcome_probs', 'swap_matrix', 'turn_outcomes')
+
+def share_tables(seeds, rules = hog_rules.default_rules):
+    '''Packs the rule tables, every score-sum diagonal of hog_sim and trot_sim, and the seed tables into shared memory
+
+       Args:
+           seeds (list): The Strategy objects to learn from
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            SharedArrays: The tables
+    '''
+    arrays = {name: getattr(rules, name) for name in rule_arrays}
+    arrays['seeds'] = numpy.stack([seed.table for seed in seeds])
+    for total in range(2 * rules.max_score + 1):
+        for i, array in enumerate(trot_sim.trot_diagonal.__wrapped__(total, rules)):  # Includes the hog_sim diagonal
+            arrays['diagonal_{}_{}'.format(total, i)] = array
+    return SharedArrays(arrays)
+
+worker_tables = None  # The SharedArrays attached to by this worker process
+worker_views = None
+worker_results = None  # The queue iterations are streamed back on
+
+def attach_worker(tables, results):
+    '''Pool initializer. Points the default rules, the module level tables of hog_rules and hog_sim, and the
+       diagonal memos of this worker at the shared tables, so that the arrays built on import can be freed and the
+       solvers never build them again. The nested list copies of hog_rules (turn_outcome_rows, turn_outcome_points
+       and swap_rows) cannot be shared and stay private, but learn never reads them, as they are only used by the
+       recursive simulators. Each run's current opponent table is also private, since only its worker reads it.
+    '''
+    global worker_tables, worker_views, worker_results
+    worker_tables, worker_results = tables, results
+    worker_views = views = tables.views()
+    rules = hog_rules.default_rules
+    for name in rule_arrays:
+        setattr(rules, name, views[name])
+    hog_rules.outcome_probs, hog_rules.free_bacon_points, hog_rules.swap_matrix, hog_rules.turn_outcomes = \
+        (views[name] for name in ('outcome_probs', 'free_bacon_points', 'swap_matrix', 'turn_outcomes'))
+    hog_sim.outcome_probs = views['outcome_probs']  # Read by get_frequencies
+    hog_sim.clear_registered_memos()
+    for total in range(2 * rules.max_score + 1):
+        diagonal = tuple(views['diagonal_{}_{}'.format(total, i)] for i in range(4))
+        hog_sim.score_diagonal.memo[(total, rules)] = diagonal[:3]
+        trot_sim.trot_diagonal.memo[(total, rules)] = diagonal
+
+def learn_seed(task):
+    '''Runs learn from one seed in a worker, putting a SeedRecord on the results queue after every iteration and
+       one with no record once the run is over
+
+       Args:
+           task (tuple): The index of the seed in the shared seed tables, 'hog' or 'trot', the number of
+                         iterations, the tolerance, and for Time Trot the tutor, or None to use the seed itself
+
+        Returns:
+            int: The index of the seed
+    '''
+    index, game, iterations, tolerance, tutor = task
+    seed = Strategy(worker_views['seeds'][index])
+    if game == 'hog':
+        records = hog_sim.learn_iterations(iterations, seed, tolerance)
+    else:
+        records = trot_sim.learn_iterations(seed if tutor is None else tutor, seed, iterations, tolerance)
+    for record in records:
+        worker_results.put(SeedRecord(index, record))
+    worker_results.put(SeedRecord(index, None))  # Marks the end of the run
+    return index
+
+def learn_seeds(seeds, game = 'hog', iterations = 12, tolerance = 1e-12, tutor = None, workers = None):
+    '''Runs learn from every seed across a pool of worker processes, yielding each iteration as soon as it finishes
+
+       Args:
+           seeds (list): The strategies to learn from
+           game (str): 'hog' to run hog_sim.learn_iterations, 'trot' to run trot_sim.learn_iterations
+           iterations (int): The iterations of each run, see the learn_iterations of the game
+           tolerance (float): See the learn_iterations of the game
+           tutor (strategy function): For Time Trot, the first tutor of every run, or None to tutor each run with its seed
+           workers (int): Number of worker processes. Defaults to the number of CPUs
+
+        Yields:
+            SeedRecord: The position of the seed in seeds, and the record of the iteration, in order of completion.
+                        The iterations of each seed arrive in order
+    '''
+    assert game in ('hog', 'trot'), "Unknown game"
+    seeds = [Strategy.from_callable(seed) for seed in seeds]
+    tutor = None if tutor is None else Strategy.from_callable(tutor)
+    tables = share_tables(seeds)
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    # Unlike multiprocessing.Pool, which replaces a killed worker and loses its task, the executor fails every
+    # unfinished task with BrokenProcessPool, so a dead worker is reported instead of waited on forever
+    pool = ProcessPoolExecutor(workers, context, attach_worker, (tables, results))
+    try:
+        pending = {pool.submit(learn_seed, (index, game, iterations, tolerance, tutor)): index
+                   for index in range(len(seeds))}
+        finished = set()
+        while len(finished) < len(seeds):
+            try:
+                result = results.get(timeout=0.1)
+            except queue.Empty:
+                for future, index in pending.items():
+                    if index not in finished and future.done() and future.exception() is not None:
+                        raise RuntimeError("Learning from seed {} did not finish".format(index)) from future.exception()
+                continue
+            if result.record is None:
+                finished.add(result.seed)
+            else:
+                yield result
+    finally:
+        processes = list((pool._processes or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:  # Stops the runs still going if the caller stops early or a seed failed
+            process.terminate()
+            process.join()
+        tables.close()
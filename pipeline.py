@@ -0,0 +1,170 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Run learn as a pipeline of stages. Counters are built in the calling process and handed on, at most depth
+         iterations ahead, to a pool of processes that evaluates them against a set of reference strategies, and
+         then to a pool of threads that encodes their images and saves them. Building the next counter only waits
+         on the later stages when they fall depth iterations behind, never on win rates, image encoding or disk.
+'''
+from collections import namedtuple, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from checkpoint import atomic_write
+from strategy import Strategy, save_strategy
+from PIL import Image
+import os
+import numpy
+import hog_sim
+import trot_sim
+import visualizer
+
+# One iteration out of the pipeline: its LearnRecord with expected_rate filled in, its expected win rate against each
+# reference strategy, and the paths of the files saved for it
+StageResult = namedtuple('StageResult', ['record', 'reference_rates', 'files'])
+
+pipeline_depth = 4  # Iterations that may wait on evaluation or rendering before counter construction waits for them
+
+# The matrices that can be rendered for each game, each called with the strategy and the opponent
+stage_matrices = {'hog': {'rate': visualizer.rate_matrix,
+                          'roll': lambda strat, opponent: visualizer.roll_matrix(strat),
+                          'frequency': visualizer.frequency_matrix},
+                  'trot': {'rate': visualizer.trot_rate_matrix,
+                           'roll': lambda strat, opponent: visualizer.roll_matrix(strat)}}
+
+def evaluate_stage(game, strat, against, references, opponent, kinds):
+    '''The evaluation stage, run in a worker process
+
+       Args:
+           game (str): 'hog' or 'trot'
+           strat (Strategy): The strategy created by the iteration
+           against (Strategy): The strategy its expected_rate is measured against, or None to leave it out
+           references (list): The Strategy objects it is evaluated against
+           opponent (Strategy): The strategy its rate and frequency matrices are measured against
+           kinds (tuple): The matrices to render, see stage_matrices
+
+        Returns:
+            tuple: The expected rate against against, the list of expected rates against references, and a dict of
+                   the matrices of each kind
+    '''
+    expected_win_rate = trot_sim.expected_win_rate if game == 'trot' else hog_sim.expected_win_rate
+    expected_rate = None if against is None else expected_win_rate(strat, against)
+    reference_rates = [expected_win_rate(strat, reference) for reference in references]
+    matrices = {kind: stage_matrices[game][kind](strat, opponent) for kind in kinds}
+    return expected_rate, reference_rates, matrices
+
+def render_stage(frame, strat, matrices, prefix, scale, directory):
+    '''The rendering stage, run in a worker thread. Frame i of kind k is saved as prefix + '_' + k + str(i) + '.png',
+       as in visualizer.render_learn, and the strategy as iteration_<i>.npy in directory, if one is given.
+
+        Returns:
+            tuple: The paths saved, and a dict of the image of each kind
+    '''
+    files, images = [], {}
+    for kind, values in matrices.items():
+        images[kind] = visualizer.color_map(values, scale)
+        fname = os.path.join(visualizer.visualization_dir, '{}_{}{}.png'.format(prefix, kind, frame))
+        visualizer.write_image((images[kind], fname))
+        files.append(fname)
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        fname = os.path.join(directory, 'iteration_{}.npy'.format(frame))
+        atomic_write(fname, lambda file: save_strategy(strat, file))
+        files.append(fname)
+    return files, images
+
+def then(future, executor, fn):
+    '''Returns a Future for fn called with the result of future, submitted to executor once future is done, so that
+       the next stage starts as soon as the last one finishes without the calling thread waiting on either
+    '''
+    chained = Future()
+    def forward(inner):
+        if inner.exception() is not None:
+            chained.set_exception(inner.exception())
+        else:
+            chained.set_result(inner.result())
+    def submit(outer):
+        if outer.exception() is not None:
+            chained.set_exception(outer.exception())
+            return
+        try:
+            executor.submit(fn, outer.result()).add_done_callback(forward)
+        except RuntimeError as error:  # The executor was shut down
+            chained.set_exception(error)
+    future.add_done_callback(submit)
+    return chained
+
+def learn_pipeline(prefix, game = 'hog', iterations = 12, seed = hog_sim.human_strat, tutor = None, references = (),
+                   opponent = None, kinds = ('rate', 'roll', 'frequency'), scale = 1, directory = None, gif = False,
+                   sheet = False, depth = pipeline_depth, workers = None, render_workers = 2, tolerance = 1e-12):
+    '''Runs learn, evaluating and rendering each iteration while the next counter is built. The seed is rendered as
+       frame 0 and the counter of iteration i as frame i + 1.
+
+       Args:
+           prefix (str): Path of the frames, relative to resources/visualizations
+           game (str): 'hog' to run hog_sim.learn_iterations, 'trot' to run trot_sim.learn_iterations
+           iterations (int): See the learn_iterations of the game
+           seed (strategy function): The strategy learn starts from
+           tutor (strategy function): For Time Trot, the first tutor, or None to tutor with the seed
+           references (list): Strategies each counter's expected win rate is measured against
+           opponent (strategy function): The strategy the rate and frequency matrices are measured against,
+                                         defaults to the seed
+           kinds (tuple): The matrices to render, see stage_matrices
+           scale (int): Width and height of the group of pixels representing each pair of scores
+           directory (str): A directory to save the strategy of every frame to, if any
+           gif (bool): True to also save each kind as an animated GIF, prefix + '_' + k + '.gif', once learn is done
+           sheet (bool): True to also save each kind as a grid of frames, prefix + '_' + k + '_sheet.png'
+           depth (int): Iterations that may wait on evaluation or rendering before counter construction waits
+           workers (int): Evaluation processes. Defaults to the number of CPUs
+           render_workers (int): Rendering threads
+           tolerance (float): See the learn_iterations of the game
+
+        Yields:
+            StageResult: Every iteration once it has been evaluated and saved, in order
+    '''
+    assert game in stage_matrices, "Unknown game"
+    assert all(kind in stage_matrices[game] for kind in kinds), "Unknown kind of matrix"
+    seed = Strategy.from_callable(seed)
+    opponent = seed if opponent is None else Strategy.from_callable(opponent)
+    references = [Strategy.from_callable(reference) for reference in references]
+    if game == 'hog':
+        records = hog_sim.learn_iterations(iterations, seed, tolerance, evaluate=False)
+    else:
+        tutor = seed if tutor is None else Strategy.from_callable(tutor)
+        records = trot_sim.learn_iterations(tutor, seed, iterations, tolerance, evaluate=False)
+    frames = {kind: [] for kind in kinds}
+    with ProcessPoolExecutor(workers) as evaluators, ThreadPoolExecutor(render_workers) as renderers:
+        def submit(frame, strat, against, record):
+            evaluated = evaluators.submit(evaluate_stage, game, strat, against, references, opponent, kinds)
+            def render(evaluation):
+                expected_rate, reference_rates, matrices = evaluation
+                files, images = render_stage(frame, strat, matrices, prefix, scale, directory)
+                record_out = None if record is None else record._replace(expected_rate=expected_rate)
+                return StageResult(record_out, reference_rates, files), images
+            return then(evaluated, renderers, render)
+        def collect(future):
+            result, images = future.result()  # Raises the error that stopped a stage
+            for kind in kinds:
+                frames[kind].append(images[kind])
+            return result
+        pending = deque([submit(0, seed, None, None)])
+        previous = seed
+        for record in records:
+            # Time Trot measures each mock counter against the seed, Hog against the strategy it counters
+            pending.append(submit(record.iteration + 1, record.strategy, previous if game == 'hog' else seed, record))
+            previous = record.strategy
+            while pending and (pending[0].done() or len(pending) > depth):
+                result = collect(pending.popleft())
+                if result.record is not None:
+                    yield result
+        while pending:
+            result = collect(pending.popleft())
+            if result.record is not None:
+                yield result
+    for kind in kinds:
+        fname = os.path.join(visualizer.visualization_dir, prefix + '_' + kind)
+        if sheet:
+            visualizer.write_image((visualizer.grid_sheet(numpy.stack(frames[kind])), fname + '_sheet.png'))
+        if gif:
+            images = [Image.fromarray(image_arr, 'RGB') for image_arr in frames[kind]]
+            images[0].save(fname + '.gif', save_all=True, append_images=images[1:], duration=500, loop=0)
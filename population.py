@@ -0,0 +1,55 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Find strong contest entries against whole fields of strategies, by countering weighted mixtures of
+         opponents and growing those mixtures with fictitious play
+'''
+from collections import namedtuple
+from strategy import Strategy
+import hog_sim
+
+# One iteration of fictitious_play: the counter added, its weighted expected win rate against the mixture before it
+# was added, and the mixture afterwards as pairs of a Strategy and its weight
+PlayRecord = namedtuple('PlayRecord', ['iteration', 'strategy', 'rate', 'population'])
+
+def normalize(field):
+    '''Returns a field of strategies as a list of pairs of a Strategy and its weight, with weights summing to 1
+
+       Args:
+           field (list): Strategies, or pairs of a strategy and its weight. Plain strategies are weighted equally
+
+        Returns:
+            list: Pairs of a Strategy and its weight, merging any strategies that make the same decisions
+    '''
+    pairs = [entry if isinstance(entry, tuple) else (entry, 1) for entry in field]
+    total = sum(weight for _, weight in pairs)
+    weights = {}
+    for strat, weight in pairs:
+        strat = Strategy.from_callable(strat)
+        weights[strat] = weights.get(strat, 0) + weight / total
+    return list(weights.items())
+
+def fictitious_play(field, iterations = 10, tolerance = 1e-9, max_passes = 20):
+    '''Grows a mixture of strategies out of a field by repeatedly adding the counter to the current mixture. After
+       t iterations the field and each counter hold an equal share of the weight, so the mixture approaches an
+       equilibrium that no single strategy can beat on average.
+
+       Args:
+           field (list): Strategies, or pairs of a strategy and its weight, forming the initial mixture
+           iterations (int): The most counters added to the mixture
+           tolerance (float): Play stops once the counter to the mixture wins no more than 0.5 + tolerance of its games
+           max_passes (int): See hog_sim.solve_population_counter
+
+        Yields:
+            PlayRecord: The counter added in each iteration, with its rate and the mixture that results
+    '''
+    population = normalize(field)
+    for iteration in range(iterations):
+        counter, _, rate = hog_sim.create_population_counter(population, max_passes)
+        share = 1 / (iteration + 2)
+        population = normalize([(strat, weight * (1 - share)) for strat, weight in population] + [(counter, share)])
+        yield PlayRecord(iteration, counter, rate, tuple(population))
+        if rate <= 0.5 + tolerance:
+            return
@@ -0,0 +1,139 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Opt in instrumentation of the solvers. Functions marked with profiled count their calls and time, and
+         solvers report the states they solve, but only while a Profile is active, so that the marks can stay in
+         place for production runs at the cost of one global lookup per call.
+'''
+import json
+import time
+import tracemalloc
+
+active_profile = None  # The Profile being recorded, if any
+
+def profiled(fn):
+    '''Decorator counting the calls and cumulative time of fn while a Profile is active. Place it beneath memoize,
+       so that memo hits are not timed and the memo's statistics still apply to the function.
+    '''
+    def profiled_fn(*args, **kwargs):
+        profile = active_profile
+        if profile is None:
+            return fn(*args, **kwargs)
+        return profile.call(name, fn, args, kwargs)
+    name = fn.__module__ + '.' + fn.__qualname__
+    profiled_fn.__name__, profiled_fn.__qualname__ = fn.__name__, fn.__qualname__
+    profiled_fn.__module__, profiled_fn.__doc__ = fn.__module__, fn.__doc__
+    profiled_fn.__wrapped__ = fn
+    return profiled_fn
+
+def count_states(states):
+    '''Adds states solved by a solver to the active Profile, if there is one, and samples the memory held by memos'''
+    if active_profile is not None:
+        active_profile.count_states(states)
+
+class Profile:
+    '''Records the calls made to profiled functions, the states solved and the memos used while it is active.
+       Use it as a context manager:
+
+           with Profile() as profile:
+               hog_sim.create_counter(hog_sim.human_strat)
+           print(profile.to_json())
+    '''
+    def __init__(self, trace_memory = False):
+        '''
+           Args:
+               trace_memory (bool): True to also record the peak memory allocated by Python with tracemalloc, which
+                                    slows down the profiled code
+        '''
+        self.trace_memory = trace_memory
+        self.calls, self.seconds, self.depth = {}, {}, {}
+        self.states = 0
+        self.peak_memo_bytes = 0
+        self.peak_traced_bytes = None
+        self.elapsed = 0.0
+        self.memos = {}
+        self.previous = self.start = self.start_memos = None
+
+    def __enter__(self):
+        global active_profile
+        import hog_sim  # Imported here since hog_sim imports this module
+        self.memo_stats = hog_sim.memo_stats
+        self.start_memos = self.memo_stats()
+        self.previous, active_profile = active_profile, self
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                self.trace_memory = False  # Someone else is already tracing, and will stop it
+            else:
+                tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        global active_profile
+        self.elapsed = time.perf_counter() - self.start
+        active_profile = self.previous
+        if self.trace_memory:
+            self.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.sample_memos()
+        return False
+
+    def call(self, name, fn, args, kwargs):
+        '''Calls a profiled function, timing it unless it is already running so that recursion is not counted twice'''
+        self.calls[name] = self.calls.get(name, 0) + 1
+        depth = self.depth.get(name, 0)
+        self.depth[name] = depth + 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.depth[name] = depth
+            if not depth:
+                self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def count_states(self, states):
+        '''See count_states'''
+        self.states += states
+        self.sample_memos()
+
+    def sample_memos(self):
+        '''Updates the memo statistics, keeping the peak of the total estimated memory held by memos'''
+        self.memos = self.memo_stats()
+        self.peak_memo_bytes = max(self.peak_memo_bytes, sum(stats['bytes'] for stats in self.memos.values()))
+
+    def report(self):
+        '''Returns the recorded statistics as a dict of plain values
+
+            Returns:
+                dict: The wall time in seconds, the calls and cumulative seconds of each profiled function, the
+                      states solved and solved per second, the hits, misses and hit ratio of every memo used
+                      while active along with its current size and estimated bytes, the peak estimated bytes of
+                      all memos and the peak traced bytes, which is None unless trace_memory was set
+        '''
+        memos = {}
+        for name, stats in self.memos.items():
+            before = self.start_memos.get(name, {'hits': 0, 'misses': 0})
+            hits, misses = stats['hits'] - before['hits'], stats['misses'] - before['misses']
+            if hits < 0 or misses < 0:  # The memo was cleared while active
+                hits, misses = stats['hits'], stats['misses']
+            if hits or misses:
+                memos[name] = {'hits': hits, 'misses': misses, 'hit_ratio': hits / (hits + misses),
+                               'size': stats['size'], 'bytes': stats['bytes']}
+        return {'seconds': self.elapsed,
+                'functions': {name: {'calls': calls, 'seconds': self.seconds.get(name, 0.0)}
+                              for name, calls in sorted(self.calls.items())},
+                'states': self.states,
+                'states_per_second': self.states / self.elapsed if self.elapsed else 0.0,
+                'memos': memos,
+                'peak_memo_bytes': self.peak_memo_bytes,
+                'peak_traced_bytes': self.peak_traced_bytes}
+
+    def to_json(self, path = None):
+        '''Returns the report as a JSON string, also writing it to path if one is given'''
+        text = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
@@ -0,0 +1,104 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Persist solved counter tables and win rate matrices on disk, addressed by the contents of the strategies
+         and rules that produced them, so that repeated requests open a file instead of solving again
+'''
+from hog_rules import default_rules
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy
+
+store_version = 2  # Bumped whenever a solver changes what it returns, so stale results are never loaded
+default_path = os.environ.get('HOG_RESULT_STORE', os.path.join(os.path.dirname(__file__), 'resources/results/'))
+
+class ResultStore:
+    '''A directory of solver results. Each result is a tuple of arrays saved as .npy files in a directory named
+       by the hash of the kind of result, the digests of the strategies involved, and the rules of the game.
+    '''
+    def __init__(self, path = default_path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, kind, strategies, rules = default_rules):
+        '''Returns the content address of a result
+
+           Args:
+               kind (str): The name of the solver that produced the result
+               strategies (tuple): The Strategy objects the result was solved for, in order
+               rules (RuleSet): The rules the result was solved under
+
+            Returns:
+                str: Hex digest identifying the result
+        '''
+        description = json.dumps([store_version, kind, [strat.digest for strat in strategies], rules.digest])
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def location(self, key):
+        '''Returns the directory holding the result with the given key'''
+        return os.path.join(self.path, key[:2], key)
+
+    def load(self, kind, strategies, rules = default_rules):
+        '''Returns a stored result as a tuple of read-only memory-mapped arrays, or None if it was never saved'''
+        location = self.location(self.key(kind, strategies, rules))
+        try:
+            with open(os.path.join(location, 'meta.json')) as meta_file:
+                count = json.load(meta_file)['count']
+        except FileNotFoundError:
+            return None
+        return tuple(numpy.load(os.path.join(location, '{}.npy'.format(i)), mmap_mode='r') for i in range(count))
+
+    def save(self, kind, strategies, arrays, rules = default_rules):
+        '''Saves a result atomically. The arrays are written to a scratch directory which is then renamed into
+           place, so readers never see a partial result. If another process saved the same result first, its
+           copy is kept.
+        '''
+        location = self.location(self.key(kind, strategies, rules))
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        scratch = tempfile.mkdtemp(dir=os.path.dirname(location))
+        for i, array in enumerate(arrays):
+            numpy.save(os.path.join(scratch, '{}.npy'.format(i)), numpy.asarray(array))
+        with open(os.path.join(scratch, 'meta.json'), 'w') as meta_file:
+            json.dump({'kind': kind, 'strategies': [strat.digest for strat in strategies],
+                       'rules': rules.digest, 'count': len(arrays)}, meta_file)
+        try:
+            os.rename(scratch, location)
+        except OSError:
+            shutil.rmtree(scratch)
+
+    def fetch(self, kind, strategies, solve, rules = default_rules):
+        '''Loads a result, solving and saving it first if it is not stored yet
+
+           Args:
+               kind (str): The name of the solver that produces the result
+               strategies (tuple): The Strategy objects to solve for
+               solve (function): Called with no arguments to produce the result as a tuple of arrays
+               rules (RuleSet): The rules the result is solved under
+
+            Returns:
+                tuple: The result's arrays
+        '''
+        result = self.load(kind, strategies, rules)
+        if result is None:
+            self.save(kind, strategies, solve(), rules)
+            result = self.load(kind, strategies, rules)
+        return result
+
+active_store = ResultStore(default_path) if 'HOG_RESULT_STORE' in os.environ else None
+
+def use_store(path = default_path):
+    '''Makes the solvers read and write results in the store at path. Pass None to stop using a store.'''
+    global active_store
+    active_store = ResultStore(path) if path is not None else None
+    return active_store
+
+def cached(kind, strategies, solve, rules = default_rules):
+    '''Fetches a result from the active store, or just solves it if no store is in use'''
+    if active_store is None:
+        return solve()
+    return active_store.fetch(kind, strategies, solve, rules)
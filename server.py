@@ -0,0 +1,225 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Answer win rate, best roll and matchup queries from a long running process, so that solved tables stay
+         in the memos of hog_sim and trot_sim between requests instead of being rebuilt by every short script.
+         Requests are JSON lines read from stdin or from clients of a Unix socket.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from strategy import Strategy, TrotStrategy, load_strategy
+from hog_rules import max_dice
+from tournament import round_robin
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import traceback
+import numpy
+import hog_sim
+import result_store
+import trot_sim
+
+# Strategies that requests can refer to by name. Other strategies are given as a path to a file saved with
+# strategy.save_strategy, or as a nested list of rolls indexed by [score1][score2]
+named_strategies = {'human_strat': hog_sim.human_strat, 'baseline': hog_sim.baseline, 'perf_strat_old': trot_sim.perf_strat_old,
+                    'a0': trot_sim.a0, 'a1': trot_sim.a1, 'a7': trot_sim.a7, 'a8': trot_sim.a8, 'hybrid': trot_sim.hybrid}
+
+# Workers only wait on each other to solve the same table, so that it is solved once and then read from the memos.
+# Queries are spread over a fixed set of locks by what they solve, and queries for other tables, or for tables
+# already memoized, go ahead while a slow solve holds its lock.
+solver_locks = [threading.Lock() for _ in range(64)]
+
+def locked(key, fn, *args):
+    '''Calls fn with args while holding the lock that key hashes to'''
+    with solver_locks[hash(key) % len(solver_locks)]:
+        return fn(*args)
+
+@hog_sim.memoize(maxsize = 256)
+def load_file(path, version):
+    '''Memoized load_strategy, where version is the modification time and size of the file, so that a file changed
+       on disk is read again'''
+    return load_strategy(path)
+
+def load_named(name):
+    '''Returns the Strategy for a name in named_strategies, or for the path of a saved strategy'''
+    if name in named_strategies:
+        return Strategy.from_callable(named_strategies[name])
+    if os.path.isfile(name):
+        stat = os.stat(name)
+        return load_file(name, (stat.st_mtime_ns, stat.st_size))
+    raise KeyError('Unknown strategy: ' + name)
+
+def check_table(spec):
+    '''Returns a table of rolls given in a request, raising ValueError unless it has one row and column per score, an
+       optional [turn][can_trot] block after them, and integer rolls from 0 to max_dice'''
+    table = numpy.asarray(spec)
+    size = hog_sim.max_score + 1
+    if table.shape not in ((size, size), (size, size) + TrotStrategy.turn_shape):
+        raise ValueError('Tables must have shape {} or {}, not {}'.format((size, size), (size, size) + TrotStrategy.turn_shape,
+                                                                          table.shape))
+    if not numpy.issubdtype(table.dtype, numpy.integer) or table.min() < 0 or table.max() > max_dice:
+        raise ValueError('Tables must hold integer rolls from 0 to {}'.format(max_dice))
+    return table
+
+def resolve(spec, trot = False):
+    '''Returns the Strategy described by a request, see named_strategies'''
+    if isinstance(spec, str):
+        strat = load_named(spec)
+    else:
+        table = check_table(spec)
+        strat = TrotStrategy(table) if table.ndim == 4 else Strategy(table)
+    if isinstance(strat, TrotStrategy) and not trot:
+        raise ValueError('Turn dependent strategies can only play Time Trot')
+    return strat
+
+def check_index(name, value, limit):
+    '''Returns value if it is an integer from 0 up to but not including limit, raising ValueError otherwise, so that
+       a request cannot index past the tables or wrap around to the other end with a negative number
+    '''
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value < limit:
+        raise ValueError('{} must be an integer from 0 to {}, not {!r}'.format(name, limit - 1, value))
+    return value
+
+def check_scores(score1, score2):
+    '''Returns the pair of scores of a request, see check_index'''
+    return check_index('score1', score1, hog_sim.max_score + 1), check_index('score2', score2, hog_sim.max_score + 1)
+
+def check_turn(request):
+    '''Returns the turn and whether Time Trot is available in a Time Trot request, defaulting to 0 and True'''
+    can_trot = request.get('can_trot', True)
+    if not isinstance(can_trot, bool):
+        raise ValueError('can_trot must be true or false, not {!r}'.format(can_trot))
+    return check_index('turn', request.get('turn', 0), 8), can_trot
+
+def win_rate_query(request):
+    '''Answers {"type": "win_rate", "strategies": [strat1, strat2], "score1": 0, "score2": 0} with strat1's chance of
+       winning when it is about to move. With "game": "trot", "turn" and "can_trot" may also be given, and a list of
+       "scores" pairs answers several states at once.
+    '''
+    trot = request.get('game', 'hog') == 'trot'
+    strat1, strat2 = (resolve(spec, trot) for spec in request['strategies'])
+    scores = [check_scores(*pair) for pair in request.get('scores', [[request.get('score1', 0), request.get('score2', 0)]])]
+    if trot:
+        turn, can_trot = check_turn(request)
+        rates = locked(('trot_win_rates', strat1, strat2), trot_sim.win_rates, strat1, strat2)[0]
+        rates = [float(rates[score1][score2][turn][int(can_trot)]) for score1, score2 in scores]
+    else:
+        rates = locked(('win_rates', strat1, strat2), hog_sim.win_rates, strat1, strat2)[0]
+        rates = [float(rates[score1][score2]) for score1, score2 in scores]
+    return rates if 'scores' in request else rates[0]
+
+def best_roll_query(request):
+    '''Answers {"type": "best_roll", "strategy": strat, "score1": 0, "score2": 0} with the roll of the optimal counter
+       to strat and its win rate, as {"roll": 4, "rate": 0.6}. With "game": "trot" the exact best response is used,
+       and "turn" and "can_trot" may also be given.
+    '''
+    trot = request.get('game', 'hog') == 'trot'
+    strat = resolve(request['strategy'], trot)
+    score1, score2 = check_scores(request.get('score1', 0), request.get('score2', 0))
+    if trot:
+        turn, can_trot = check_turn(request)
+        table, rates, _ = locked(('trot_best_response', strat), trot_sim.best_response_solution, strat)
+        index = (score1, score2, turn, int(can_trot))
+    else:
+        table, rates, _ = locked(('counter', strat), hog_sim.counter_solution, strat)
+        index = (score1, score2)
+    return {'roll': int(table[index]), 'rate': float(rates[index])}
+
+def matchup_query(request):
+    '''Answers {"type": "matchup", "strategies": [...]} with the matrix of expected win rates between every pair of
+       strategies, see tournament.round_robin. "game": "trot" plays Time Trot.
+    '''
+    trot = request.get('game', 'hog') == 'trot'
+    strategies = [resolve(spec, trot) for spec in request['strategies']]
+    expected_win_rate = trot_sim.expected_win_rate if trot else hog_sim.expected_win_rate
+    evaluate = lambda strat1, strat2: locked((trot, strat1, strat2), expected_win_rate, strat1, strat2)
+    return round_robin(strategies, evaluate, workers=1).rates.tolist()
+
+query_types = {'win_rate': win_rate_query, 'best_roll': best_roll_query, 'matchup': matchup_query}
+
+def answer(request):
+    '''Answers one request, returning {"id": ..., "result": ...}, or {"id": ..., "error": ...} if it failed'''
+    response = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+    try:
+        query = query_types[request['type']]
+        response['result'] = query(request)
+    except (KeyError, ValueError, TypeError, IndexError, AssertionError) as error:
+        response['error'] = '{}: {}'.format(type(error).__name__, error)
+    except Exception as error:  # A bug, which must not take down the server with it
+        traceback.print_exc()
+        response['error'] = 'Internal error: {}: {}'.format(type(error).__name__, error)
+    return response
+
+def answer_line(line):
+    '''Answers a line holding one JSON request, or a JSON list of requests answered as a list in the same order'''
+    try:
+        requests = json.loads(line)
+    except ValueError as error:
+        return json.dumps({'id': None, 'error': 'Invalid JSON: {}'.format(error)})
+    if isinstance(requests, list):
+        return json.dumps([answer(request) for request in requests])
+    return json.dumps(answer(requests))
+
+def serve_stream(lines, output):
+    '''Answers each non-blank line of a stream of requests, flushing every answer so that callers can wait on it'''
+    for line in lines:
+        if line.strip():
+            output.write(answer_line(line) + '\n')
+            output.flush()
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    '''Serves one client of the Unix socket until it disconnects'''
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write((answer_line(line.decode()) + '\n').encode())
+                self.wfile.flush()
+
+class QueryServer(socketserver.UnixStreamServer):
+    '''A Unix socket server handing each client to a fixed pool of worker threads'''
+    def __init__(self, path, workers = 8):
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a server that did not shut down cleanly
+        super().__init__(path, QueryHandler)
+        self.pool = ThreadPoolExecutor(workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.serve_client, request, client_address)
+
+    def serve_client(self, request, client_address):
+        '''Runs in a worker thread, see socketserver.ThreadingMixIn.process_request_thread'''
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Answer JSON lines queries about Hog strategies')
+    parser.add_argument('--socket', help='path of a Unix socket to listen on, instead of reading stdin')
+    parser.add_argument('--workers', type=int, default=8, help='clients served at once on the socket')
+    parser.add_argument('--store', help='result store to read and write solved tables, see result_store')
+    args = parser.parse_args()
+    if args.store:
+        result_store.use_store(args.store)
+    if args.socket:
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # Exit through the with block, removing the socket
+        with QueryServer(args.socket, args.workers) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    else:
+        serve_stream(sys.stdin, sys.stdout)
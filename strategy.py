@@ -0,0 +1,190 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Store Hog strategies as compact tables of rolls that hash by content, so that memos and saved
+         results can be shared between any two strategies that make the same decisions
+'''
+from hog_rules import max_score
+import hashlib
+import pickle
+import sys
+import weakref
+import numpy
+
+class Strategy:
+    '''A strategy backed by a (max_score + 1)x(max_score + 1) table of rolls, indexed by [score1][score2]. Games
+       played to other goals use tables with one row and column per possible score.
+       Strategies are called like strategy functions, and compare and hash by the contents of their tables.
+    '''
+    __slots__ = ('table', 'digest', '_hash', '__weakref__')
+    _converted = weakref.WeakKeyDictionary()
+    turn_shape = ()  # The axes of the table after [score1][score2]
+
+    def __init__(self, table):
+        table = numpy.array(table, dtype=numpy.uint8)
+        table.flags.writeable = False
+        self._set_table(table)
+
+    def _set_table(self, table):
+        '''Adopts a read only uint8 table of rolls without copying it'''
+        assert table.ndim == 2 + len(self.turn_shape) and table.shape[0] == table.shape[1] \
+            and table.shape[2:] == self.turn_shape, "Invalid table shape"
+        self.table = table
+        self.digest = hashlib.blake2b(table.tobytes(), digest_size=16).hexdigest()
+        self._hash = hash(self.digest)
+
+    @classmethod
+    def from_callable(cls, strat, size = max_score + 1):
+        '''Converts a strategy function to a Strategy by evaluating it at every pair of scores.
+           Conversions are cached for as long as the function is alive.
+
+           Args:
+               strat (strategy function): The strategy to convert. Strategies are returned unchanged
+               size (int): The number of possible scores of each player, see hog_rules.RuleSet
+
+            Returns:
+                Strategy: A strategy making the same decisions as strat
+
+        '''
+        if isinstance(strat, Strategy):
+            assert len(strat.table) == size, "Strategy was made for a different goal"
+            return strat
+        try:
+            return cls._converted[strat][size]
+        except (KeyError, TypeError):
+            pass
+        converted = cls([[strat(y, x) for x in range(size)] for y in range(size)])
+        try:
+            cls._converted.setdefault(strat, {})[size] = converted
+        except TypeError:  # Not every callable supports weak references
+            pass
+        return converted
+
+    @property
+    def size(self):
+        '''The number of possible scores of each player'''
+        return len(self.table)
+
+    def __call__(self, score1, score2):
+        return self.table.item(score1, score2)
+
+    def __getitem__(self, score1):
+        return self.table[score1]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.table
+        return self.table.astype(dtype)
+
+    def __eq__(self, other):
+        if not isinstance(other, Strategy):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), (self.table,)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.digest[:12])
+
+class TrotStrategy(Strategy):
+    '''A Time Trot strategy backed by a (max_score + 1)x(max_score + 1)x8x2 table of rolls, indexed by
+       [score1][score2][turn][can_trot], so that its rolls can depend on the turn number and the ability to trot.
+    '''
+    __slots__ = ()
+    turn_shape = (8, 2)
+
+    @classmethod
+    def from_callable(cls, strat, size = max_score + 1):
+        '''Converts a strategy to a TrotStrategy that makes the same roll on every turn. TrotStrategies are
+           returned unchanged.
+        '''
+        if isinstance(strat, TrotStrategy):
+            assert len(strat.table) == size, "Strategy was made for a different goal"
+            return strat
+        table = Strategy.from_callable(strat, size).table
+        return cls(numpy.broadcast_to(table[..., None, None], table.shape + cls.turn_shape))
+
+    def __call__(self, score1, score2, turn = 0, can_trot = True):
+        return self.table.item(score1, score2, turn, int(can_trot))
+
+class StoredStrategy(Strategy):
+    '''A Strategy saved with save_strategy, which is not read until it is first used. Turn dependent strategies
+       are loaded with load_strategy instead. The table is memory mapped,
+       so strategies that are never played cost nothing to import and the pages of the file are shared between
+       processes.
+    '''
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __getattr__(self, name):
+        if name not in ('table', 'digest', '_hash'):
+            raise AttributeError(name)
+        table = load_table(self.path)
+        Strategy._set_table(self, table)
+        return getattr(self, name)
+
+    def __reduce__(self):
+        return Strategy, (self.table,)
+
+def save_strategy(strat, path):
+    '''Saves a strategy as a .npy file holding its uint8 table of rolls
+
+       Args:
+           strat (strategy function): The strategy to save. Strategy functions are converted with Strategy.from_callable
+           path (str): Path of the file
+    '''
+    if not isinstance(strat, Strategy):
+        strat = Strategy.from_callable(strat)
+    numpy.save(path, numpy.ascontiguousarray(strat.table), allow_pickle=False)
+
+def load_table(path):
+    '''Memory maps the table of rolls saved at path, refusing files that hold anything other than a uint8 array'''
+    table = numpy.load(path, mmap_mode='r', allow_pickle=False)
+    assert table.dtype == numpy.uint8, "Strategy files hold uint8 tables"
+    return table
+
+def load_strategy(path):
+    '''Loads a strategy saved with save_strategy, as a TrotStrategy if its rolls depend on the turn
+
+       Args:
+           path (str): Path of the file
+
+        Returns:
+            Strategy: The saved strategy, backed by the memory mapped table
+    '''
+    table = load_table(path)
+    strat = object.__new__(TrotStrategy if table.ndim == 4 else Strategy)
+    strat._set_table(table)
+    return strat
+
+def convert_pickle(source, destination = None, size = max_score + 1):
+    '''Converts a pickled nested list of rolls to the format of save_strategy. Only convert trusted pickles, as
+       loading one can run arbitrary code.
+
+       Args:
+           source (str): Path of the pickle
+           destination (str): Path of the new file, defaults to source with the extension replaced by .npy
+           size (int): The number of possible scores of each player. Tables that stop short of the goal are padded
+                       by repeating their last row and column
+
+        Returns:
+            str: The path of the new file
+    '''
+    with open(source, 'rb') as file:
+        table = numpy.array(pickle.load(file), dtype=numpy.uint8)
+    padding = [(0, size - length) for length in table.shape[:2]] + [(0, 0)] * (table.ndim - 2)
+    destination = destination or source.rsplit('.', 1)[0] + '.npy'
+    save_strategy(Strategy(numpy.pad(table, padding, mode='edge')), destination)
+    return destination
+
+if __name__ == '__main__':
+    for source in sys.argv[1:]:
+        print(source, '->', convert_pickle(source))
@@ -0,0 +1,27 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Pin the rule tables of house rule games, so that raising the goal keeps the rules of Hog. Run with
+         python -m unittest
+'''
+from hog_rules import RuleSet, default_rules, free_bacon
+import unittest
+
+class FreeBaconTest(unittest.TestCase):
+    def test_original_goal(self):
+        self.assertEqual(free_bacon(47), 8)
+        self.assertEqual(free_bacon(100), 11)  # 100 counts as the digits 10 and 0 in the original rules
+        self.assertEqual(list(default_rules.free_bacon_points[[0, 9, 47, 90, 100]]), [1, 10, 8, 10, 11])
+
+    def test_higher_goals_use_every_digit(self):
+        rules = RuleSet(max_score=250)
+        self.assertEqual(rules.free_bacon_points[245], 6)
+        self.assertEqual(rules.free_bacon_points[199], 10)
+        self.assertEqual(rules.free_bacon_points[200], 3)
+        self.assertEqual(RuleSet(max_score=1000).free_bacon_points[999], 10)
+        self.assertEqual(rules.max_points, default_rules.max_points)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+'''
+Created on Oct 16, 2026
+
+@author: ckw017
+
+Purpose: Run round robin tournaments between many strategies, solving every matchup independently across a pool
+         of worker processes
+'''
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple
+from strategy import Strategy
+import hog_sim
+import numpy
+
+Standings = namedtuple('Standings', ['rates', 'wins', 'ranking'])
+
+def play_matchup(matchup):
+    '''Solves a single matchup. Takes one tuple argument so that it can be mapped over a process pool.
+
+       Args:
+           matchup (tuple): The evaluation function, and the two Strategy objects to evaluate
+
+        Returns:
+            float: The expected win rate of the first strategy against the second
+    '''
+    evaluate, strat1, strat2 = matchup
+    return evaluate(strat1, strat2)
+
+def round_robin(strategies, evaluate = hog_sim.expected_win_rate, workers = None, chunksize = 4):
+    '''Plays every pair of strategies against each other once
+
+       Args:
+           strategies (list): Strategy functions or Strategy objects. The list is not modified
+           evaluate (function): Module level function returning the expected win rate of its first argument
+                                against its second, such as hog_sim.expected_win_rate or trot_sim.expected_win_rate
+           workers (int): Number of worker processes. Defaults to the number of CPUs, 1 plays every matchup in this process
+           chunksize (int): Number of matchups sent to a worker at a time
+
+        Returns:
+            Standings: rates, where rates[i][j] is the expected win rate of strategies[i] against strategies[j],
+                       wins, the number of matchups won by each strategy, and ranking, the indices of the strategies
+                       ordered by wins, then by average win rate
+    '''
+    tabled = [Strategy.from_callable(strat) for strat in strategies]
+    pairs = [(i, j) for j in range(len(tabled)) for i in range(j)]
+    matchups = [(evaluate, tabled[j], tabled[i]) for i, j in pairs]
+    if workers == 1:
+        results = list(map(play_matchup, matchups))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(play_matchup, matchups, chunksize=chunksize))
+    rates = numpy.full((len(tabled), len(tabled)), 0.5)
+    wins = numpy.zeros(len(tabled), dtype=int)
+    for (i, j), rate in zip(pairs, results):
+        rates[j, i], rates[i, j] = rate, 1 - rate
+        wins[j if rate > 0.5 else i] += 1  # As in compete, a dead even matchup goes to the earlier strategy
+    ranking = numpy.lexsort((-rates.mean(axis=1), -wins))
+    return Standings(rates, wins, ranking)
@@ -6,18 +6,24 @@ Created on Sept 25, 2017
 Purpose: Simulate and find the expected win rate for two strategies in the game of Hog, with the modified rule set
          Create an optimal counter strategy by selecting the best rolls for each set of scores when playing against a given strategy
 '''
-from hog_sim import memoize, get_frequencies, is_swap, roll_dice, max_score
-import sys
-import pickle
+from hog_sim import memoize, memoized_for, clear_registered_memos, LearnRecord, LearnState, is_swap, roll_dice, max_score, score_diagonal, tie_tolerance
+from hog_sim import cell_regret
+from strategy import Strategy, TrotStrategy, StoredStrategy
+from result_store import cached
+from profiling import profiled, count_states
+from tournament import round_robin
+import monte_carlo
+from hog_rules import default_rules, swap_rows, turn_outcome_rows, turn_outcome_points
 import os
+import numpy
+import time
 
 resources_path = os.path.join(os.path.dirname(__file__), 'resources/')
 
-sys.setrecursionlimit(5000)
+memo_maxsize = 2 ** 20  # Entries kept per memo before the least recently used are evicted
 
 # strats
-perf_table_old = pickle.load(open(resources_path + 'strategies/perf_table_old.p', 'rb'))
-perf_strat_old = lambda a, b: perf_table_old[a][b]
+perf_strat_old = StoredStrategy(resources_path + 'strategies/perf_table_old.npy')  # Converted from perf_table_old.p
 a0 = lambda x, y: 0
 a1 = lambda x, y: 1
 a7 = lambda x, y: 7
@@ -27,7 +33,50 @@ def hybrid(x, y):
     if x or y: return 4
     return 0
 
-@memoize
+@profiled
+def solve_occupancy(table1, table2, rules = default_rules):
+    '''Calculates the expected frequency of every combination of scores, turn number and time trot ability in a game
+       between two strategies in one forward pass. Each player moves first half the time, and probability mass is
+       pushed from every state to the states that can follow it, one score-sum diagonal at a time.
+
+       Args:
+           table1 (array-like): Player 1's roll table, indexed by [score1][score2]
+           table2 (array-like): Player 2's roll table, indexed by [score2][score1]
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: Arrays of shape (max_score + 1)x(max_score + 1)x8x2, where
+                [score1][score2][turn][can_trot] is expected_frequency(strat1, strat2, score1, score2, turn, can_trot)
+                and [score2][score1][turn][can_trot] is expected_frequency(strat2, strat1, score2, score1, turn, can_trot)
+    '''
+    size = rules.size
+    tables = numpy.stack([numpy.asarray(table1), numpy.asarray(table2)]).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    turns, next_turns = numpy.arange(8), (numpy.arange(8) + 1) % 8
+    # Indexed by [player][can_trot][state * 8 + turn]. The extra states collect the mass of finished games
+    frequencies = numpy.zeros((2, 2, (size * size + 2) * 8), dtype=rules.dtype)
+    frequencies[:, 1, 0] = 0.5
+    for total in range(2 * rules.max_score + 1):
+        score1, score2, next_index, trot_index = memoized_for(trot_diagonal, rules)(total, rules)
+        flat = (score1 * size + score2)[:, None] * 8 + turns
+        for player in (0, 1):
+            rolls = tables[player, score1, score2]
+            freqs = probs[rolls, score2][..., None]
+            trotting = numpy.where(rolls[:, None] == turns, frequencies[player, 1, flat], 0)
+            passing = frequencies[player, 0, flat] + frequencies[player, 1, flat] - trotting
+            frequencies[1 - player, 1] += numpy.bincount((next_index[..., None] * 8 + next_turns).ravel(),
+                                                         (freqs * passing[:, None]).ravel(), minlength=(size * size + 2) * 8)
+            frequencies[player, 0] += numpy.bincount((trot_index[..., None] * 8 + next_turns).ravel(),
+                                                     (freqs * trotting[:, None]).ravel(), minlength=(size * size + 2) * 8)
+    count_states(32 * size * size)
+    return tuple(frequencies[..., :-16].reshape(2, 2, size, size, 8).transpose(0, 2, 3, 4, 1))
+
+@memoize(maxsize = 64)
+def occupancy(strat1, strat2, rules = default_rules):
+    '''Memoized solve_occupancy for a pair of Strategy objects'''
+    return solve_occupancy(strat1.table, strat2.table, rules)
+
+@profiled
 def expected_frequency(strat1, strat2, score1, score2, turn, can_trot):
     '''Calculates the expected frequency that a combination of scores, turn number, and time trot ability
        Takes place in a game between strat1 and strat2
@@ -43,55 +92,76 @@ def expected_frequency(strat1, strat2, score1, score2, turn, can_trot):
         Returns:
             float: The expected frequency of appearance of the turn defined by the arguments in a match between Player 1 and Player 2
     '''
-    if score1 == 0:  # If you score is 0, then you have yet to move
-        if score2 == 0 and turn == 0 and can_trot: return 0.5  # Checks if you have the first turn (Occurs 50% of the time)
-        return second_move_base_case(strat2, score2, turn, can_trot)  # Checks if you had the second move
-    if is_swap(score1, score2): score1, score2 = score2, score1
-    total_freq, prev_turn = 0, (turn + 7) % 8
-    for i in range(1, 61):
-        if can_trot:
-            prev_score2 = score2 - i
-            if prev_score2 >= 0:
-                prev_dice2 = strat2(prev_score2, score1)
-                freqs = get_frequencies(prev_dice2, score1)
-                if i in freqs: 
-                    total_freq += expected_frequency(strat2, strat1, prev_score2, score1, prev_turn, False) * freqs[i]
-                    if prev_dice2 != prev_turn: total_freq += expected_frequency(strat2, strat1, prev_score2, score1, prev_turn, True) * freqs[i]
-        else:
-            prev_score1 = score1 - i
-            if prev_score1 >= 0:
-                prev_dice1 = strat1(prev_score1, score2)
-                if prev_dice1 == prev_turn:
-                    freqs = get_frequencies(prev_dice1, score2)
-                    if i in freqs: total_freq += expected_frequency(strat1, strat2, prev_score1, score2, prev_turn, True) * freqs[i]
-    return total_freq
-
-@memoize   
-def second_move_base_case(strat2, score2, turn, can_trot):
-    '''Base case for expected_expected frequency to determine if you had the second move.
-    
+    frequencies = occupancy(Strategy.from_callable(strat1), Strategy.from_callable(strat2))[0]
+    return float(frequencies[score1][score2][turn][int(can_trot)])
+
+@profiled
+def solve_mock_counter(tutor_table, strat_table, rules = default_rules, resume = None, snapshot = None):
+    '''Solves for the mock counter against strat in one pass over the score-sum diagonals, highest first. At every
+       pair of scores, the win rate of each roll is averaged over the turn numbers and time trot abilities, weighted
+       by how often they occur in a match between tutor and strat.
+
        Args:
-          strat2 (strategy function): The Player 2's strategy function
-          score2 (int): Player 2's current score
-          turn (int): The current turn number
-          can_trot (bool): True if Player 1 can use time trot, False otherwise
-          
-       Returns:
-           float: The expected frequency of appearance of the turn defined by the arguments in a match between Player 1 and Player 2
+           tutor_table (array-like): The tutor's roll table, indexed by [score1][score2]
+           strat_table (array-like): The roll table of the strategy to counter
+           rules (RuleSet): The goal and dice of the game
+           resume (tuple): A score sum and the arrays passed to snapshot, see hog_sim.solve_counter
+           snapshot (function): Called after each diagonal with the next score sum to solve and the solver's
+                                internal (counter_table, counter_rates, opponent_rates) arrays
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The mock counter's roll table, its win rates when about to move,
+                which are the same on every turn, and strat's win rates when about to move, indexed by
+                [score1][score2][turn][can_trot]
     '''
-    if (turn != 1 and turn != 2) or not can_trot: return 0  # strat1's first move can only take place on turns 1 or 2, and you should be able to trot
-    num_dice = strat2(0, 0)  # strat1's roll on the first turn
-    if num_dice and turn == 1:  # Opponent didn't time trot
-        freqs = get_frequencies(num_dice)
-        if score2 in freqs: return 0.5 * freqs[score2]  # Probability that strat1 had the first turn and rolled enough to reach current score
-    elif not num_dice and turn == 2:  # The opponent has time trotted
-        num_dice = strat2(1, 0)  # strat1's roll on the second turn. Score will always be 1-0
-        freqs = get_frequencies(num_dice, 0)
-        if score2 - 1 in freqs: return 0.5 * freqs[score2 - 1]  # Probability that strat1 had the first turn and rolled enough to reach current score
-        return 0
-    return 0  # Impossible situation -> 0 frequency
+    size = rules.size
+    strat_table = numpy.asarray(strat_table).astype(numpy.intp)
+    weights = solve_occupancy(tutor_table, strat_table, rules)[0]
+    probs = rules.turn_outcomes[..., 1:]
+    turns = numpy.arange(8)
+    rolls = numpy.arange(rules.max_dice + 1)
+    counter_table = numpy.zeros((size, size), dtype=numpy.uint8)
+    # The two extra states hold the opponent's rate and the mover's rate once the mover has won
+    counter_rates = numpy.zeros(size * size + 2, dtype=rules.dtype)
+    counter_rates[-1] = 1
+    opponent_rates = numpy.zeros((2, size * size + 2, 8), dtype=rules.dtype)  # Indexed by [can_trot][state][turn]
+    opponent_rates[:, -1] = 1
+    start = 2 * rules.max_score
+    if resume is not None:
+        start, (counter_table[:], counter_rates[:], opponent_rates[:]) = resume
+    for total in range(start, -1, -1):
+        score1, score2, next_index, trot_index = memoized_for(trot_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        freqs = probs[:, score2]
+        passed = numpy.roll(1 - (freqs[..., None, :] @ opponent_rates[1].take(next_index, axis=0))[..., 0, :], -1, axis=-1)
+        trotted = (freqs * counter_rates[trot_index]).sum(axis=-1)
+        roll_sets = numpy.stack([passed, numpy.where((rolls[:, None] == turns)[:, None], trotted[..., None], passed)], axis=-1)
+        state_weights = weights[score1, score2]
+        total_weights = state_weights.sum(axis=(1, 2))
+        rates = numpy.minimum((roll_sets * state_weights).sum(axis=(2, 3)) / numpy.where(total_weights, total_weights, 1), 1)
+        best_rates = rates.max(axis=0)
+        counter_table[score1, score2] = (rates >= best_rates - tie_tolerance).argmax(axis=0)  # Ties go to the fewest dice
+        counter_rates[flat] = best_rates
 
-@memoize
+        opponent_rolls = strat_table[score1, score2]
+        freqs = probs[opponent_rolls, score2]
+        passed = 1 - (freqs * counter_rates[next_index]).sum(axis=-1)
+        trotted = numpy.roll((freqs[:, None] @ opponent_rates[0].take(trot_index, axis=0))[:, 0], -1, axis=-1)
+        opponent_rates[0, flat] = passed[:, None]
+        opponent_rates[1, flat] = numpy.where(opponent_rolls[:, None] == turns, trotted, passed[:, None])
+        if snapshot is not None:
+            snapshot(total - 1, (counter_table, counter_rates, opponent_rates))
+    count_states(17 * size * size)
+    return (counter_table, counter_rates[:-2].reshape(size, size),
+            opponent_rates[:, :-2].reshape(2, size, size, 8).transpose(1, 2, 3, 0))
+
+@memoize(maxsize = 64)
+def mock_solution(tutor, strat, rules = default_rules):
+    '''Memoized solve_mock_counter for a pair of Strategy objects, kept in the active result store if there is one'''
+    return cached('mock_counter', (tutor, strat), lambda: solve_mock_counter(tutor.table, strat.table, rules), rules)
+
+@memoize(maxsize = memo_maxsize)
+@profiled
 def sim_counter_sets(tutor, strat, score1, score2, turn, can_trot):
     '''Determines the win rates of all possible number of dice for a set of scores for a given turn and ability to trot
        Predicts using the win rate of tutor against strat.
@@ -109,16 +179,16 @@ def sim_counter_sets(tutor, strat, score1, score2, turn, can_trot):
     '''
     roll_set = ()
     for num_rolls in range(11):
-        freqs = get_frequencies(num_rolls, score2)
+        freqs, points_scored = turn_outcome_rows[num_rolls][score2], turn_outcome_points[num_rolls][score2]
         if (num_rolls == turn) and can_trot: 
             roll_set += (sum([apply_rules_counter(tutor, strat, score1 + points, score2, turn, can_trot, sim_counter, True)
-                        * freqs[points] for points in freqs]),)
+                        * freqs[points] for points in points_scored]),)
         else: 
             roll_set += (sum([apply_rules_counter(tutor, strat, score1 + points, score2, turn, can_trot, sim_opponent, False) 
-                        * freqs[points] for points in freqs]),)
+                        * freqs[points] for points in points_scored]),)
     return roll_set
 
-@memoize
+@profiled
 def sim_counter(tutor, strat, score1=0, score2=0, turn=0, can_trot=True):
     '''Simulates a match between tutor and strat, and uses that information to develop a counter strategy to strat.
        Will NOT create a perfect counter strategy, since the expected turn frequencies used to calculate the ideal
@@ -135,84 +205,208 @@ def sim_counter(tutor, strat, score1=0, score2=0, turn=0, can_trot=True):
        Returns:
            tuple: tuple containing the best roll with the best win rate and that rate
     '''
-    best_roll, best_rate = 0, 0
-    roll_sets = ([sim_counter_sets(tutor, strat, score1, score2, turn, True) for turn in range(8)] + 
-                 [sim_counter_sets(tutor, strat, score1, score2, turn, False) for turn in range(8)])
-    total_frequency = sum([expected_frequency(tutor, strat, score1, score2, turn, True) for turn in range(8)] + 
-                          [expected_frequency(tutor, strat, score1, score2, turn, False) for turn in range(8)])
-    if total_frequency:
-        for num_rolls in range(11):
-            total_rate = 0
-            for i in range(16):
-                if i < 8: total_rate += roll_sets[i][num_rolls] * (expected_frequency(tutor, strat, score1, score2, i, True) / total_frequency)
-                else: total_rate += roll_sets[i][num_rolls] * (expected_frequency(tutor, strat, score1, score2, i % 8, False) / total_frequency)
-            if total_rate > 1: total_rate = 1
-            if total_rate > best_rate: best_rate, best_roll = total_rate, num_rolls
-    return best_rate, best_roll
+    counter_table, counter_rates, _ = mock_solution(Strategy.from_callable(tutor), Strategy.from_callable(strat))
+    return float(counter_rates[score1][score2]), int(counter_table[score1][score2])
 
-@memoize
 def sim_opponent(tutor, strat, score1, score2, turn, can_trot):
     '''Simulates strat when playing against tutor. Returns strat's win rate for the given scores and turn number'''
-    num_rolls = strat(score1, score2)
-    freqs = get_frequencies(num_rolls, score2)
-    if (num_rolls == turn) and can_trot:
-        return sum([apply_rules_counter(tutor, strat, score1 + points, score2, turn, can_trot, sim_opponent, True) * freqs[points] for points in freqs]), num_rolls
-    return sum([apply_rules_counter(tutor, strat, score1 + points, score2, turn, can_trot, sim_counter, False) * freqs[points] for points in freqs]), num_rolls
+    opponent_rates = mock_solution(Strategy.from_callable(tutor), Strategy.from_callable(strat))[2]
+    return float(opponent_rates[score1][score2][turn][int(can_trot)]), strat(score1, score2)
 
-@memoize
 def apply_rules_counter(tutor, strat, score1, score2, turn, can_trot, sim_next, trotted):
     '''Applies the rules of the game, and then returns the win rate of the player whose turn is next'''
     if score1 > max_score: return 1
-    if is_swap(score1, score2): score1, score2 = score2, score1
+    if swap_rows[score1][score2]: score1, score2 = score2, score1
     next_turn = (turn + 1) % 8
     if trotted: return sim_next(tutor, strat, score1, score2, next_turn, False)[0]
     return 1 - sim_next(tutor, strat, score2, score1, next_turn, True)[0]
 
-def create_mock_counter(tutor, strat):
+@profiled
+def create_mock_counter(tutor, strat, rules = default_rules):
     '''Creates a counter strategy, based on the expected frequencies of turns in a match between tutor and strat.
-       The strategy created will NOT be the perfect counter to strat.
+       The strategy created will NOT be the perfect counter to strat. Strategy functions are tabulated up to
+       rules.max_score.
        Returns a tuple of the strategy, it's lookup table, and its rate against strat.
     
     '''
-    counter_table = []
-    for y in range(max_score + 1):
-        counter_table.append([0] * (max_score + 1))
-        for x in range(max_score + 1):
-            counter_table[y][x] = sim_counter(tutor, strat, y, x)[1]
-    
-    
-    def mock_counter(score1, score2):
-        '''Mock counter strategy against strat, relying on turn frequencies of the tutor's gameplay'''
-        return counter_table[score1][score2]
-    
-    return mock_counter, counter_table, sim_counter(tutor, strat, 0, 0)[0]
+    counter_table, counter_rates, _ = mock_solution(Strategy.from_callable(tutor, rules.size), Strategy.from_callable(strat, rules.size),
+                                                    rules)
+    mock_counter = Strategy(counter_table)
+    return mock_counter, mock_counter.table, float(counter_rates[0][0])
 
-def learn(tutor, seed, iterations=1):
+def learn_iterations(tutor, seed, iterations=1, tolerance=1e-12, evaluate=True, rules=default_rules, resume=None,
+                     snapshot=None):
+    '''Creates mock counter strategies in sequence, using previous outputs as tutors for the next iteration.
+       Every mock counter is kept in the active result store, if there is one.
+       Learning stops early once a mock counter's rate changes by no more than tolerance, or once it is the same
+       as its tutor. Yields a LearnRecord for each mock counter created, where changed_cells counts the cells
+       that differ from its tutor. If evaluate is False, expected_rate is left as None. Games are played by rules.
+       resume and snapshot checkpoint the run as in hog_sim.learn_iterations, with the tutor as the LearnState's
+       strategy and no warm start.
+    '''
+    seed = Strategy.from_callable(seed, rules.size)
+    if resume is None:
+        resume = LearnState(0, Strategy.from_callable(tutor, rules.size), None, None, None, False)
+    if resume.finished:
+        return
+    tutor, last_rate, partial = resume.strategy, resume.last_rate, resume.partial
+    for iteration in range(resume.iteration, iterations):
+        start = time.perf_counter()
+        progress = None
+        if snapshot is not None:
+            progress = lambda total, arrays: snapshot(LearnState(iteration, tutor, None, last_rate, (total, arrays), False), None)
+        counter_table, counter_rates, _ = cached('mock_counter', (tutor, seed),
+                                                 lambda: solve_mock_counter(tutor.table, seed.table, rules, partial, progress), rules)
+        partial = None
+        mock_counter = Strategy(counter_table)
+        rate = float(counter_rates[0][0])
+        changed_cells = int(numpy.count_nonzero(mock_counter.table != tutor.table))
+        expected_rate = expected_win_rate(mock_counter, seed, rules) if evaluate else None
+        record = LearnRecord(iteration, mock_counter, rate, expected_rate, changed_cells, time.perf_counter() - start)
+        finished = not changed_cells or (last_rate is not None and abs(rate - last_rate) <= tolerance)
+        tutor, last_rate = mock_counter, rate
+        if snapshot is not None:
+            snapshot(LearnState(iteration + 1, tutor, None, last_rate, None, finished), record)
+        yield record
+        if finished:
+            return
+
+@profiled
+def learn(tutor, seed, iterations=1, tolerance=1e-12, rules=default_rules):
     '''Create's mock counter strategies in sequence, using previous outputs as tutors for the next iteration.
-       Returns a list of all mock counter strategies created.
+       See learn_iterations for the record of each iteration.
+       Returns a list of all mock counter strategies created, with their lookup tables and mock rates.
     '''
-    print("Iterations Left: ", iterations)
-    mock = create_mock_counter(tutor, seed)
-    print("Mock Rate: ", mock[2])
-    print("Rate: ", expected_win_rate(mock[0], seed))
-    pickle.dump(mock[1:], open('iter' + str(iterations) + ".p", 'wb'))
-    if iterations > 1:
-        clear_memos()
-        return [mock] + learn(mock[0], seed, iterations - 1)
-    return [mock]
-
-def compete(strategies):
-    '''Returns of a dict strategies and the number of matches won.'''
-    strat_wins = {strat : 0 for strat in strategies}
-    for strat1 in reversed(strategies):
-        for strat2 in strategies[:-1]:
-            if expected_win_rate(strat1, strat2) > 0.5: strat_wins[strat1] += 1
-            else: strat_wins[strat2] += 1
-        clear_memos()
-        strategies.pop()
-    return strat_wins
+    return [(record.strategy, record.strategy.table, record.rate) for record in learn_iterations(tutor, seed, iterations, tolerance, rules=rules)]
 
-@memoize
+def screen(strategies, benchmark, threshold=0.5, seed=None, method='sprt', **options):
+    '''Returns the strategies that are not found to lose to benchmark by simulating as few games as needed, so that
+       exact solves are only spent on strategies that could place well.
+
+       Args:
+           strategies (list): Strategy functions or Strategy objects
+           benchmark (strategy function): The strategy each one is played against
+           threshold (float): Strategies decided to win less often than this against benchmark are dropped
+           seed (int): Seed for the dice
+           method (str): See monte_carlo.estimate_win_rate. SPRT stops on every matchup, even one at exactly threshold
+           options: Further arguments for estimate_win_rate, such as confidence or indifference
+
+        Returns:
+            list: The strategies kept, in their original order
+    '''
+    rng = numpy.random.default_rng(seed)
+    return [strat for strat in strategies
+            if estimate_win_rate(strat, benchmark, None, threshold, rng, method=method, **options).better is not False]
+
+@profiled
+def compete(strategies, workers=None, benchmark=None, **options):
+    '''Returns of a dict strategies and the number of matches won. Matchups are spread across workers processes,
+       see tournament.round_robin for the full win rate matrix and rankings. If a benchmark strategy is given,
+       strategies that lose to it are screened out first and left out of the dict, see screen.'''
+    if benchmark is not None:
+        strategies = screen(strategies, benchmark, **options)
+    standings = round_robin(strategies, expected_win_rate, workers)
+    return {strat : int(wins) for strat, wins in zip(strategies, standings.wins)}
+
+@memoize(maxsize = 1024)
+def trot_diagonal(total, rules = default_rules):
+    '''Extends score_diagonal with the state the mover continues from after time trotting
+
+       Args:
+           total (int): The sum of the two scores
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray: The mover's scores, the opponent's scores, and
+                arrays of flat indices of the opponent's next state and of the mover's next state after trotting, for
+                1 to rules.max_points points. These are (max_score + 1)**2 and (max_score + 1)**2 + 1 if the mover has already won
+    '''
+    size = rules.size
+    score1, score2, next_index = memoized_for(score_diagonal, rules)(total, rules)
+    won = next_index == size * size
+    trot_index = numpy.where(won, size * size + 1, (next_index % size) * size + next_index // size)
+    return score1, score2, next_index, trot_index
+
+def turn_rates(freqs, mover_rates, opponent_rates, next_index, trot_index):
+    '''Calculates the mover's win rates on every turn for the states on a score-sum diagonal, once after passing
+       the turn to the opponent and once after time trotting
+
+       Args:
+           freqs (numpy.ndarray): Probabilities of scoring 1 to 60 points, indexed by [...][state][points]
+           mover_rates (numpy.ndarray): The mover's rates when it cannot trot, indexed by [state][turn]
+           opponent_rates (numpy.ndarray): The opponent's rates when it can trot, indexed by [state][turn]
+           next_index (numpy.ndarray): The opponent's next state for each state and number of points, see trot_diagonal
+           trot_index (numpy.ndarray): The mover's next state after trotting, see trot_diagonal
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The rates after passing and after trotting, indexed by [...][state][turn]
+    '''
+    # Rates for each turn the next state could be on, shifted so that [turn] holds the rate on turn + 1
+    passed = numpy.roll(1 - (freqs[..., None, :] @ opponent_rates.take(next_index, axis=0))[..., 0, :], -1, axis=-1)
+    trotted = numpy.roll((freqs[..., None, :] @ mover_rates.take(trot_index, axis=0))[..., 0, :], -1, axis=-1)
+    return passed, trotted
+
+def policy_rates(rolls, score2, mover_rates, opponent_rates, next_index, trot_index, rules = default_rules):
+    '''Calculates the mover's win rates on every turn for the states on a score-sum diagonal when making given rolls
+
+       Args:
+           rolls (numpy.ndarray): The mover's roll at each state, or at each [state][turn][can_trot]
+           score2 (numpy.ndarray): The opponent's score at each state
+           mover_rates, opponent_rates, next_index, trot_index: See turn_rates
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: The rates when the mover cannot and can trot, indexed by [state][turn]
+    '''
+    probs = rules.turn_outcomes[..., 1:]
+    turns = numpy.arange(8)
+    if rolls.ndim == 1:
+        passed, trotted = turn_rates(probs[rolls, score2], mover_rates, opponent_rates, next_index, trot_index)
+        return passed, numpy.where(rolls[:, None] == turns, trotted, passed)
+    # The rolls depend on the turn, so every roll is solved and the chosen ones are picked out
+    passed, trotted = turn_rates(probs[:, score2], mover_rates, opponent_rates, next_index, trot_index)
+    states = numpy.arange(len(rolls))[:, None]
+    rolls, trot_rolls = rolls[..., 0], rolls[..., 1]
+    return passed[rolls, states, turns], numpy.where(trot_rolls == turns, trotted[trot_rolls, states, turns],
+                                                     passed[trot_rolls, states, turns])
+
+@profiled
+def solve_game(table1, table2, rules = default_rules):
+    '''Solves every state of a game between two strategies at once, including the turn number and whether the
+       mover can time trot. Every turn strictly increases the sum of the scores, whether or not the mover trotted,
+       so states are solved one diagonal at a time, starting from the highest total.
+
+       Args:
+           table1 (array-like): Player 1's roll table, indexed by [score1][score2], or by [score1][score2][turn][can_trot]
+           table2 (array-like): Player 2's roll table, indexed by [score2][score1], or by [score2][score1][turn][can_trot]
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: Arrays of shape (max_score + 1)x(max_score + 1)x8x2, where
+                [score1][score2][turn][can_trot] is sim_game(strat1, strat2, score1, score2, turn, can_trot)
+                and [score2][score1][turn][can_trot] is sim_game(strat2, strat1, score2, score1, turn, can_trot)
+    '''
+    size = rules.size
+    tables = [numpy.asarray(table).astype(numpy.intp) for table in (table1, table2)]
+    # Indexed by [player][can_trot][state][turn]. The two extra states hold the opponent's rate and the mover's
+    # rate once the mover has won
+    rates = numpy.zeros((2, 2, size * size + 2, 8), dtype=rules.dtype)
+    rates[:, :, -1] = 1
+    for total in range(2 * rules.max_score, -1, -1):
+        score1, score2, next_index, trot_index = memoized_for(trot_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        for player in (0, 1):
+            rates[player, 0, flat], rates[player, 1, flat] = policy_rates(tables[player][score1, score2], score2, rates[player, 0],
+                                                                          rates[1 - player, 1], next_index, trot_index, rules)
+    count_states(32 * size * size)
+    return tuple(rates[:, :, :-2].reshape(2, 2, size, size, 8).transpose(0, 2, 3, 4, 1))
+
+@memoize(maxsize = 64)
+def win_rates(strat1, strat2, rules = default_rules):
+    '''Memoized solve_game for a pair of Strategy objects, kept in the active result store if there is one'''
+    return cached('trot_win_rates', (strat1, strat2), lambda: solve_game(strat1.table, strat2.table, rules), rules)
+
+@profiled
 def sim_game(strat1=a0, strat2=a0, score1=0, score2=0, turn=0, can_trot=True):
     '''Plays a simulated game between two strategies from a given set of scores.
        Returns the expected probability of strat1 winning against strat2.
@@ -228,12 +422,10 @@ def sim_game(strat1=a0, strat2=a0, score1=0, score2=0, turn=0, can_trot=True):
             
     '''
     assert 0 <= turn <= 7, "Invalid turn"
-    num_dice = strat1(score1, score2)
-    trotted = num_dice == turn and can_trot
-    freqs = get_frequencies(num_dice, score2)
-    return sum([apply_rules(strat1, strat2, score1 + points, score2, turn, trotted) * freqs[points] for points in freqs])
+    rates = win_rates(Strategy.from_callable(strat1), Strategy.from_callable(strat2))[0]
+    return float(rates[score1][score2][turn][int(can_trot)])
 
-@memoize
+@profiled
 def apply_rules(strat1, strat2, score1, score2, turn, trotted):
     '''Applies the rules of Hog, then simulates strat2's turn to predict the win rate of strat1.
        See https://cs61a.org/proj/hog/ for more details on the rules.
@@ -252,37 +444,209 @@ def apply_rules(strat1, strat2, score1, score2, turn, trotted):
     '''
     assert 0 <= turn <= 7, "Invalid turn"
     if score1 > max_score: return 1
-    if is_swap(score1, score2): score1, score2 = score2, score1
+    if swap_rows[score1][score2]: score1, score2 = score2, score1
     if trotted: return sim_game(strat1, strat2, score1, score2, (turn + 1) % 8, False)
     return 1 - sim_game(strat2, strat1, score2, score1, (turn + 1) % 8, True)
 
-
 def clear_memos():
     '''Clears the memos of methods used in learn'''
-    expected_frequency.memo = {}
-    sim_counter_sets.memo = {}
-    sim_counter.memo = {}
-    sim_opponent.memo = {}
-    apply_rules_counter.memo = {}
-    apply_rules.memo = {}
-    sim_game.memo = {}
+    clear_registered_memos(__name__)
 
 def play(strat1, strat2, score1=0, score2=0, turn=0, can_trot=True):
     '''Plays an actual game using random, fair dice'''
     assert 0 <= turn <= 7, "Invalid turn"
-    num_dice = strat1(score1, score2)
+    num_dice = strat1(score1, score2, turn, can_trot) if isinstance(strat1, TrotStrategy) else strat1(score1, score2)
     score1 += roll_dice(num_dice, score2)
     if score1 > max_score: return 1
     if is_swap(score1, score2): score1, score2 = score2, score1
     if num_dice == turn and can_trot: return play(strat1, strat2, score1, score2, (turn + 1) % 8, False)
     return 1 - play(strat2, strat1, score2, score1, (turn + 1) % 8, True)
 
-def expected_win_rate(strat1, strat2):
-    '''Calculates the expected win rate of a given strategy'''
-    return (sim_game(strat1, strat2) + 1 - sim_game(strat2, strat1)) / 2
+def expected_win_rate(strat1, strat2, rules = default_rules):
+    '''Calculates the expected win rate of a given strategy in a game played by rules'''
+    rates1, rates2 = win_rates(Strategy.from_callable(strat1, rules.size), Strategy.from_callable(strat2, rules.size), rules)
+    return (float(rates1[0][0][0][1]) + 1 - float(rates2[0][0][0][1])) / 2
+
+@profiled
+def solve_best_response(table = None, rules = default_rules):
+    '''Solves for the exact best response to a strategy over every score, turn number and time trot ability.
+       Every turn strictly increases the sum of the scores, so one backward pass over the score-sum diagonals is
+       a complete value iteration: each state's rates only depend on states that are already solved.
+
+       Args:
+           table (array-like): The opponent's roll table, indexed by [score1][score2] or by
+                               [score1][score2][turn][can_trot]. If None, the opponent plays the response itself,
+                               which gives the minimax-optimal strategy
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The response's roll table, its win rates when about to move,
+                and the opponent's win rates when about to move, all indexed by [score1][score2][turn][can_trot]
+    '''
+    size = rules.size
+    if table is not None:
+        table = numpy.asarray(table).astype(numpy.intp)
+    probs = rules.turn_outcomes[..., 1:]
+    turns = numpy.arange(8)
+    trots = numpy.arange(rules.max_dice + 1)[:, None, None] == turns  # [roll][state][turn]: True if rolling trots
+    response_table = numpy.zeros((size, size, 8, 2), dtype=numpy.uint8)
+    # Indexed by [player][can_trot][state][turn] like in solve_game, with the response as player 0
+    rates = numpy.zeros((2, 2, size * size + 2, 8), dtype=rules.dtype)
+    rates[:, :, -1] = 1
+    opponent = 0 if table is None else 1
+    for total in range(2 * rules.max_score, -1, -1):
+        score1, score2, next_index, trot_index = memoized_for(trot_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        passed, trotted = turn_rates(probs[:, score2], rates[0, 0], rates[opponent, 1], next_index, trot_index)
+        roll_rates = numpy.stack([passed, numpy.where(trots, trotted, passed)], axis=-1)
+        best_rates = roll_rates.max(axis=0)
+        response_table[score1, score2] = (roll_rates >= best_rates - tie_tolerance).argmax(axis=0)  # Ties go to the fewest dice
+        rates[0, 0, flat], rates[0, 1, flat] = best_rates[..., 0], best_rates[..., 1]
+        if table is not None:
+            rates[1, 0, flat], rates[1, 1, flat] = policy_rates(table[score1, score2], score2, rates[1, 0], rates[0, 1],
+                                                                next_index, trot_index, rules)
+    count_states(32 * size * size)
+    rates = rates[:, :, :-2].reshape(2, 2, size, size, 8).transpose(0, 2, 3, 4, 1)
+    return response_table, rates[0], rates[opponent]
+
+@memoize(maxsize = 64)
+def best_response_solution(strat, rules = default_rules):
+    '''Memoized solve_best_response for a Strategy object, kept in the active result store if there is one'''
+    return cached('trot_best_response', (strat,), lambda: solve_best_response(strat.table, rules), rules)
+
+@memoize
+def optimal_solution(rules = default_rules):
+    '''Memoized solve_best_response for the minimax-optimal strategy, kept in the active result store if there is one'''
+    return cached('trot_optimal', (), lambda: solve_best_response(rules=rules), rules)
+
+def create_best_response(strat, rules = default_rules):
+    '''Creates the exact best response to strat, which rolls depending on the turn number and time trot ability
+
+       Args:
+           strat (strategy function): The strategy to be countered
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
+
+        Returns:
+            TrotStrategy, numpy.ndarray, float: The best response to strat, its lookup table indexed by
+                                                [score1][score2][turn][can_trot], and its win rate when it moves first
+    '''
+    response_table, response_rates, _ = best_response_solution(Strategy.from_callable(strat, rules.size), rules)
+    response = TrotStrategy(response_table)
+    return response, response.table, float(response_rates[0][0][0][1])
+
+def create_optimal(rules = default_rules):
+    '''Creates the minimax-optimal strategy, which no strategy can beat on average. Its win rate against itself is
+       0.5, so the rate returned is the one it gets when it moves first against any strategy that also plays optimally.
+
+       Args:
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            TrotStrategy, numpy.ndarray, float: The optimal strategy, its lookup table indexed by
+                                                [score1][score2][turn][can_trot], and its win rate when it moves first
+    '''
+    optimal_table, optimal_rates, _ = optimal_solution(rules)
+    optimal = TrotStrategy(optimal_table)
+    return optimal, optimal.table, float(optimal_rates[0][0][0][1])
+
+@profiled
+def solve_q_values(table = None, policy = None, rules = default_rules):
+    '''Solves for the win rate of every roll at every score, turn number and time trot ability against a strategy,
+       in one pass over the score-sum diagonals. This is the table of all rolls that solve_best_response takes the
+       best of, and that sim_counter_sets finds one state at a time.
+
+       Args:
+           table (array-like): The opponent's roll table, indexed by [score1][score2] or by
+                               [score1][score2][turn][can_trot]. If None, the opponent plays like the mover does
+                               after its first roll
+           policy (array-like): The roll table followed after the first roll, in either shape. If None, every later
+                                roll is the best one, so the rates are those of the best response after each first roll
+           rules (RuleSet): The goal and dice of the game
+
+        Returns:
+            numpy.ndarray, numpy.ndarray, numpy.ndarray: The win rate of each first roll, indexed by
+                [score1][score2][turn][can_trot][roll], and the rates of the policy (or the best response) and of
+                the opponent when about to move, indexed by [score1][score2][turn][can_trot]
+    '''
+    size = rules.size
+    table, policy = (None if rolls is None else numpy.asarray(rolls).astype(numpy.intp) for rolls in (table, policy))
+    probs = rules.turn_outcomes[..., 1:]
+    turns = numpy.arange(8)
+    trots = numpy.arange(rules.max_dice + 1)[:, None, None] == turns  # [roll][state][turn]: True if rolling trots
+    q_values = numpy.zeros((size * size, 8, 2, rules.max_dice + 1), dtype=rules.dtype)
+    # Indexed by [player][can_trot][state][turn] like in solve_game, with the mover as player 0
+    rates = numpy.zeros((2, 2, size * size + 2, 8), dtype=rules.dtype)
+    rates[:, :, -1] = 1
+    opponent = 0 if table is None else 1
+    for total in range(2 * rules.max_score, -1, -1):
+        score1, score2, next_index, trot_index = memoized_for(trot_diagonal, rules)(total, rules)
+        flat = score1 * size + score2
+        passed, trotted = turn_rates(probs[:, score2], rates[0, 0], rates[opponent, 1], next_index, trot_index)
+        roll_rates = numpy.stack([passed, numpy.where(trots, trotted, passed)], axis=-1)  # [roll][state][turn][can_trot]
+        q_values[flat] = numpy.moveaxis(roll_rates, 0, -1)
+        if policy is None:
+            chosen = roll_rates.max(axis=0)
+        else:
+            rolls = policy[score1, score2] if policy.ndim == 4 else policy[score1, score2, None, None]
+            rolls = numpy.broadcast_to(rolls, roll_rates.shape[1:])
+            chosen = numpy.take_along_axis(roll_rates, rolls[None], axis=0)[0]
+        rates[0, 0, flat], rates[0, 1, flat] = chosen[..., 0], chosen[..., 1]
+        if table is not None:
+            rates[1, 0, flat], rates[1, 1, flat] = policy_rates(table[score1, score2], score2, rates[1, 0], rates[0, 1],
+                                                                next_index, trot_index, rules)
+    count_states(32 * size * size)
+    rates = rates[:, :, :-2].reshape(2, 2, size, size, 8).transpose(0, 2, 3, 4, 1)
+    return q_values.reshape(size, size, 8, 2, -1), rates[0], rates[opponent]
+
+@memoize(maxsize = 64)
+def q_value_solution(strat, policy = None, rules = default_rules):
+    '''Memoized solve_q_values for Strategy objects, kept in the active result store if there is one'''
+    strategies = (strat,) if policy is None else (strat, policy)
+    return cached('trot_q_values', strategies, lambda: solve_q_values(strat.table, None if policy is None else policy.table, rules),
+                  rules)
+
+def q_values(strat, policy = None, rules = default_rules):
+    '''Returns the win rate of every roll at every score, turn number and time trot ability against strat, see
+       solve_q_values. hog_sim.roll_regret, cell_regret and top_two_margin reduce the result.
+
+       Args:
+           strat (strategy function): The opponent
+           policy (strategy function): The strategy followed after the first roll, or None to play the best response
+           rules (RuleSet): The goal and dice of the game. Strategy functions are tabulated up to rules.max_score
+
+        Returns:
+            numpy.ndarray: The win rates, indexed by [score1][score2][turn][can_trot][roll]
+    '''
+    policy = None if policy is None else Strategy.from_callable(policy, rules.size)
+    return q_value_solution(Strategy.from_callable(strat, rules.size), policy, rules)[0]
+
+def regret(strat, opponent, rules = default_rules):
+    '''Returns how much strat could gain in each state by changing only that cell of its table, against opponent,
+       indexed by [score1][score2][turn][can_trot]'''
+    strat = Strategy.from_callable(strat, rules.size)
+    table = strat.table if isinstance(strat, TrotStrategy) else strat.table[..., None, None]
+    return cell_regret(q_values(opponent, strat, rules), table)
+
+def simplification_cost(strat, opponent, simplified, rules = default_rules):
+    '''Measures what is lost by replacing strat with a simpler table against opponent, see
+       hog_sim.simplification_cost. The simplified strategy must not depend on the turn.
+
+        Returns:
+            numpy.ndarray, float: The cost of each state, indexed by [score1][score2][turn][can_trot], and the drop
+                                  in expected win rate against opponent
+    '''
+    strat, simplified, opponent = (Strategy.from_callable(s, rules.size) for s in (strat, simplified, opponent))
+    q = q_values(opponent, strat, rules)
+    table = strat.table if isinstance(strat, TrotStrategy) else strat.table[..., None, None]
+    costs = cell_regret(q, simplified.table[..., None, None]) - cell_regret(q, table)
+    return costs, float((occupancy(simplified, opponent, rules)[0] * costs).sum())
+
+def average_win_rate(strat1, strat2, num_matches=1000, seed=None):
+    '''Calculates the average win rate of strat1 for num_matches amount of games between strat1 and strat2.
+       The games are played in lockstep by monte_carlo, with dice drawn from a generator seeded by seed.'''
+    return monte_carlo.average_win_rate(strat1, strat2, num_matches, seed, trot=True)
 
-def average_win_rate(strat1, strat2, num_matches=1000):
-    '''Calculates the average win rate of strat1 for num_matches amount of games between strat1 and strat2'''
-    first_turn = sum([play(strat1, strat2) for _ in range(num_matches // 2)])
-    second_turn = num_matches / 2 - sum([play(strat2, strat1) for _ in range(num_matches // 2)])
-    return (first_turn + second_turn) / num_matches
+def estimate_win_rate(strat1, strat2, precision = 0.01, threshold = None, seed = None, **options):
+    '''Estimates the win rate of strat1 against strat2 from as few games as needed for the precision or the decision
+       asked for, see monte_carlo.estimate_win_rate for the options.'''
+    return monte_carlo.estimate_win_rate(strat1, strat2, precision, threshold, seed=seed, trot=True, **options)
@@ -1,25 +1,94 @@
-from hog_sim import expected_frequency, human_strat, create_counter, max_score, sim_game
-from trot_sim import perf_strat_old, create_mock_counter
+from hog_sim import occupancy, human_strat, max_score, sim_game, win_rates
+from concurrent.futures import ProcessPoolExecutor
+from strategy import Strategy
 from PIL import Image
+import trot_sim
 import numpy
 from math import pi, atan
 import os
 
-def visualize_rate(strat1, strat2, fn, fname):
-    '''Creates a visualization of a function relating to a game of Hog, in the form of a 500x500 image.
-       5x5 groups of pixels are used to represent a functions output for a given input of scores. The
-       first player's score is represented on the x-axis, while the second is along the y.
+visualization_dir = os.path.join(os.path.dirname(__file__), 'resources/visualizations')
+
+def rate_matrix(strat1, strat2):
+    '''Returns strat1's win rate against strat2 from every pair of scores, the matrix form of sim_game'''
+    return win_rates(Strategy.from_callable(strat1), Strategy.from_callable(strat2))[0]
+
+def trot_rate_matrix(strat1, strat2):
+    '''Returns strat1's win rate against strat2 on turn 0 with Time Trot available, the matrix form of trot_sim.sim_game'''
+    return trot_sim.win_rates(Strategy.from_callable(strat1), Strategy.from_callable(strat2))[0][:, :, 0, 1]
+
+def roll_matrix(strat):
+    '''Returns the amount of dice rolled by strat from every pair of scores, divided by 10'''
+    return Strategy.from_callable(strat).table / 10
+
+def frequency_matrix(strat1, strat2, contrast = 5000):
+    '''Returns the frequency of every pair of scores in a game between strat1 and strat2, adjusted as in create_adjusted_ef'''
+    frequencies = occupancy(Strategy.from_callable(strat1), Strategy.from_callable(strat2))[0]
+    average = frequencies.sum()/10000
+    return (numpy.arctan((frequencies - average) * contrast) + pi/2)/pi
+
+# The four argument functions that visualize_rate evaluates as whole matrices instead of pixel by pixel
+matrix_forms = {sim_game: rate_matrix, trot_sim.sim_game: trot_rate_matrix}
+
+def color_map(values, scale = 1):
+    '''Colours matrices of values between 0.0 and 1.0, from red for 0.0 to green for 1.0. The first player's score
+       is represented on the x-axis, while the second is along the y, increasing upwards.
+
+       Args:
+           values (array-like): A matrix indexed by [score1][score2], or a stack of them with any leading axes
+           scale (int): Width and height of the group of pixels representing each pair of scores
+
+        Returns:
+            numpy.ndarray: RGB images as uint8, with the same leading axes as values
     '''
-    fname = os.path.join(os.path.dirname(__file__), 'resources/visualizations/' + fname)
-    image_arr = numpy.zeros((max_score + 1, max_score + 1, 3), dtype=numpy.uint8)
-    for y in range(max_score + 1):
-        for x in range(max_score + 1):
-            rate = fn(strat1, strat2, y, x)
-            image_arr[max_score - x][y] = [255 * (1 - rate), 255 * rate, 127]
+    values = numpy.clip(numpy.asarray(values, dtype=float), 0, 1)
+    image_arr = numpy.empty(values.shape + (3,), dtype=numpy.uint8)
+    image_arr[..., 0] = 255 * (1 - values)
+    image_arr[..., 1] = 255 * values
+    image_arr[..., 2] = 127
+    image_arr = numpy.flip(image_arr.swapaxes(-2, -3), axis=-3)
+    return image_arr.repeat(scale, axis=-3).repeat(scale, axis=-2)
+
+def evaluate(strat1, strat2, fn):
+    '''Returns the output of a four argument function relating to a game of Hog for every pair of scores, as
+       a matrix indexed by [score1][score2]. Functions in matrix_forms, and functions with a matrix attribute
+       like the ones made by create_strat_wrapper and create_adjusted_ef, are evaluated all at once.
+    '''
+    if fn in matrix_forms:
+        return matrix_forms[fn](strat1, strat2)
+    if hasattr(fn, 'matrix'):
+        return fn.matrix
+    return numpy.array([[fn(strat1, strat2, y, x) for x in range(max_score + 1)] for y in range(max_score + 1)])
+
+def write_image(job):
+    '''Saves one RGB image. Takes one tuple argument so that it can be mapped over a process pool.
+
+       Args:
+           job (tuple): The uint8 image array, and the path to save it to
+    '''
+    image_arr, fname = job
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
     img = Image.fromarray(image_arr, 'RGB')
     img.save(fname)
     img.close()
 
+def visualize_matrix(values, fname, scale = 1):
+    '''Saves a matrix of values between 0.0 and 1.0, indexed by [score1][score2], as an image, see color_map
+
+       Args:
+           values (array-like): The matrix to visualize
+           fname (str): Path of the image, relative to resources/visualizations
+           scale (int): Width and height of the group of pixels representing each pair of scores
+    '''
+    write_image((color_map(values, scale), os.path.join(visualization_dir, fname)))
+
+def visualize_rate(strat1, strat2, fn, fname, scale = 1):
+    '''Creates a visualization of a function relating to a game of Hog, in the form of an image.
+       scale x scale groups of pixels are used to represent a functions output for a given input of scores. The
+       first player's score is represented on the x-axis, while the second is along the y.
+    '''
+    visualize_matrix(evaluate(strat1, strat2, fn), fname, scale)
+
 def create_strat_wrapper(strat):
     '''Wraps a strategy into a four argument function so that it can be passed into visualize_rate.    
     '''
@@ -27,6 +96,7 @@ def create_strat_wrapper(strat):
         '''Returns the amount of dice rolled by strat divided by 10.
         '''
         return strat(score1, score2)/10
+    strat_wrapper.matrix = roll_matrix(strat)
     return strat_wrapper
 
 def create_adjusted_ef(strat1, strat2, contrast = 5000):
@@ -34,22 +104,97 @@ def create_adjusted_ef(strat1, strat2, contrast = 5000):
        average frequency, scaled using atan to fit between 0.0 and 1.0. Larger contrast value makes
        deviation from the mean more pronounced in the visualization.
     '''
-    average = 0 
-    for x in range(max_score + 1):
-        for y in range(max_score + 1):
-            average += expected_frequency(strat1, strat2, x, y)/10000
+    frequencies = occupancy(Strategy.from_callable(strat1), Strategy.from_callable(strat2))[0]
+    average = frequencies.sum()/10000
     
     def adjusted_ef(ni1, ni2, score1, score2):
         '''Returns an adjusted frequency for a turns appearance for better visualization.'''
-        return (atan((expected_frequency(strat1, strat2, score1, score2) - average) * contrast) + pi/2)/pi
+        return (atan((frequencies[score1][score2] - average) * contrast) + pi/2)/pi
     
+    adjusted_ef.matrix = frequency_matrix(strat1, strat2, contrast)
     return adjusted_ef
 
+def grid_sheet(images, columns = None):
+    '''Tiles a stack of images into one sheet, left to right then top to bottom, leaving unused tiles black
+
+       Args:
+           images (numpy.ndarray): Images with shape (frames, height, width, 3)
+           columns (int): Tiles per row, defaults to a roughly square sheet
+
+        Returns:
+            numpy.ndarray: The sheet as a single image
+    '''
+    frames, height, width, _ = images.shape
+    columns = columns or int(numpy.ceil(numpy.sqrt(frames)))
+    rows = -(-frames // columns)
+    tiles = numpy.zeros((rows * columns, height, width, 3), dtype=numpy.uint8)
+    tiles[:frames] = images
+    return tiles.reshape(rows, columns, height, width, 3).transpose(0, 2, 1, 3, 4).reshape(rows * height, columns * width, 3)
+
+def render_batch(values, fnames, scale = 1, workers = None, gif = None, sheet = None, columns = None, duration = 500):
+    '''Colour maps a stack of matrices in one step, then saves each frame as an image across a pool of workers
+
+       Args:
+           values (array-like): Matrices indexed by [frame][score1][score2], with values between 0.0 and 1.0
+           fnames (list): Path of each frame's image, relative to resources/visualizations
+           scale (int): Width and height of the group of pixels representing each pair of scores
+           workers (int): Number of worker processes. Defaults to the number of CPUs, 1 saves every frame in this process
+           gif (str): Path of an animated GIF of the frames to save as well, if any
+           sheet (str): Path of a grid of all the frames to save as well, if any
+           columns (int): Frames per row of the sheet, see grid_sheet
+           duration (int): Milliseconds each frame of the GIF is shown for
+
+        Returns:
+            numpy.ndarray: The RGB images of the frames
+    '''
+    images = color_map(values, scale)
+    jobs = [(image_arr, os.path.join(visualization_dir, fname)) for image_arr, fname in zip(images, fnames)]
+    if sheet:
+        jobs.append((grid_sheet(images, columns), os.path.join(visualization_dir, sheet)))
+    if workers == 1 or len(jobs) == 1:
+        list(map(write_image, jobs))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            list(executor.map(write_image, jobs))
+    if gif:
+        frames = [Image.fromarray(image_arr, 'RGB') for image_arr in images]
+        frames[0].save(os.path.join(visualization_dir, gif), save_all=True, append_images=frames[1:], duration=duration, loop=0)
+    return images
+
+def render_learn(strategies, opponent = human_strat, prefix = 'learn_500/human_iter', kinds = ('rate', 'roll', 'frequency'),
+                 scale = 1, workers = None, gif = False, sheet = False, columns = None):
+    '''Renders every strategy of a learn run as one batch of frames per kind of visualization. Frame i of kind k
+       is saved as prefix + '_' + k + str(i) + '.png'.
+
+       Args:
+           strategies (iterable): The strategies of the run in order, or the LearnRecords from learn_iterations
+           opponent (strategy function): The strategy each win rate and frequency is measured against
+           prefix (str): Path of the frames, relative to resources/visualizations
+           kinds (tuple): Any of 'rate' (see rate_matrix), 'roll' (see roll_matrix) and 'frequency' (see frequency_matrix)
+           scale (int): Width and height of the group of pixels representing each pair of scores
+           workers (int): See render_batch
+           gif (bool): True to also save each kind as an animated GIF, prefix + '_' + k + '.gif'
+           sheet (bool): True to also save each kind as a grid of frames, prefix + '_' + k + '_sheet.png'
+           columns (int): Frames per row of the sheets
+
+        Returns:
+            dict: The stack of matrices rendered for each kind
+    '''
+    strategies = [getattr(strat, 'strategy', strat) for strat in strategies]
+    matrices = {'rate': lambda strat: rate_matrix(strat, opponent),
+                'roll': roll_matrix,
+                'frequency': lambda strat: frequency_matrix(strat, opponent)}
+    batches = {}
+    for kind in kinds:
+        values = numpy.stack([matrices[kind](strat) for strat in strategies])
+        fnames = [prefix + '_' + kind + str(i) + '.png' for i in range(len(strategies))]
+        render_batch(values, fnames, scale, workers, gif and prefix + '_' + kind + '.gif',
+                     sheet and prefix + '_' + kind + '_sheet.png', columns)
+        batches[kind] = values
+    return batches
+
 if __name__ == '__main__':
-    seed = human_strat
-    for i in range(15):
-        print(i);
-        visualize_rate(seed, human_strat, sim_game, 'learn_500/human_iter_rate' + str(i) + '.png')
-        seed = create_counter(seed)[0]
-    
-        
\ No newline at end of file
+    from pipeline import learn_pipeline  # Imported here since pipeline imports this module
+    for result in learn_pipeline('learn_500/human_iter', iterations=13, seed=human_strat, gif=True, sheet=True):
+        record = result.record
+        print(record.iteration + 1, record.rate, record.changed_cells, record.seconds)